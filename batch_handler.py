@@ -0,0 +1,68 @@
+import os
+import csv
+import json
+
+JOB_FIELDS = ('folder_path', 'input_file_path', 'date', 'time_of_day', 'window_radius', 'output_path', 'tempfill_type', 'sensor')
+
+def read_manifest(manifest_path):
+    """
+    Reads a job manifest (JSON, CSV or YAML).
+
+    JSON and YAML manifests hold a list of jobs, or a mapping with a 'jobs'
+    list. CSV manifests have one job per row with a header line. Each job
+    has the keys of JOB_FIELDS; tempfill_type may be left out and is then
+    'annual' when a date is given and 'diurnal' otherwise. sensor may be
+    left out and then defaults to 'landsat' for annual and 'himawari' for
+    diurnal jobs.
+
+    Args:
+        manifest_path (str): Path to the manifest file.
+
+    Returns:
+        list: List of job dictionaries.
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+    with open(manifest_path, newline='', encoding='utf-8') as f:
+        if extension == '.csv':
+            jobs = list(csv.DictReader(f))
+        elif extension in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML manifests requires PyYAML (pip install pyyaml).")
+            jobs = yaml.safe_load(f)
+        else:
+            jobs = json.load(f)
+
+    if isinstance(jobs, dict):
+        jobs = jobs['jobs']
+    return [normalize_job(job, manifest_path, n) for n, job in enumerate(jobs, 1)]
+
+def normalize_job(job, manifest_path='<manifest>', number=0):
+    """
+    Validates a job and fills in its optional fields.
+
+    Args:
+        job (dict): Job as read from the manifest.
+        manifest_path (str, optional): Path to the manifest, for error messages.
+        number (int, optional): Position of the job in the manifest, for error messages.
+
+    Returns:
+        dict: Job with every key of JOB_FIELDS.
+    """
+    job = {key: (None if value == '' else value) for key, value in job.items()}
+    for key in ('folder_path', 'input_file_path', 'window_radius', 'output_path'):
+        if job.get(key) is None:
+            raise ValueError(f"{manifest_path}: job {number} is missing '{key}'")
+
+    if job.get('tempfill_type') is None:
+        job['tempfill_type'] = 'annual' if job.get('date') else 'diurnal'
+    if job['tempfill_type'] == 'annual' and not job.get('date'):
+        raise ValueError(f"{manifest_path}: annual job {number} needs a 'date' (format: YYYY-MM-DD)")
+    if job['tempfill_type'] == 'diurnal' and not job.get('time_of_day'):
+        raise ValueError(f"{manifest_path}: diurnal job {number} needs a 'time_of_day' (format: YYYY-MM-DD_HHMM)")
+    if job['tempfill_type'] not in ('annual', 'diurnal'):
+        raise ValueError(f"{manifest_path}: job {number} has an invalid tempfill_type '{job['tempfill_type']}'")
+
+    job['window_radius'] = int(job['window_radius'])
+    return {key: job.get(key) for key in JOB_FIELDS}
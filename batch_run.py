@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import batch_handler
+import main_function
+from tempfil import (
+    get_sensor_profile,
+    default_sensor_profile,
+    list_stack_files,
+    load_stack,
+    file_signatures,
+    hash_key,
+    format_time,
+    get_parse_key,
+)
+
+def get_sensor(job):
+    return get_sensor_profile(job['sensor']) if job.get('sensor') else default_sensor_profile(job['tempfill_type'])
+
+class StackCache:
+    """
+    Keeps the most recently used stacks in memory so jobs on the same folder load it once.
+
+    Args:
+        max_stacks (int): Number of stacks kept in memory.
+    """
+    def __init__(self, max_stacks=2):
+        self.max_stacks = max_stacks
+        self.stacks = OrderedDict()
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, folder_path, tempfill_type, sensor):
+        key = (os.path.abspath(folder_path), tempfill_type, sensor)
+        with self.lock:
+            key_lock = self.locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self.lock:
+                if key in self.stacks:
+                    self.stacks.move_to_end(key)
+                    return self.stacks[key]
+            stack = load_stack(folder_path, get_parse_key(sensor, tempfill_type))
+            with self.lock:
+                self.stacks[key] = stack
+                while len(self.stacks) > self.max_stacks:
+                    self.stacks.popitem(last=False)
+            return stack
+
+def job_fingerprint(job):
+    """
+    Hashes a job together with the name, size and mtime of every file it reads.
+
+    Args:
+        job (dict): Normalised job.
+
+    Returns:
+        str: Fingerprint of the job.
+    """
+    file_paths = [file_path for _, file_path in list_stack_files(job['folder_path'], get_parse_key(get_sensor(job), job['tempfill_type']))]
+    return hash_key([job, file_signatures(file_paths + [job['input_file_path']])])
+
+def read_state(state_path):
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_state(state_path, state):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, state_path)
+
+def run_job(job, stacks, workers=1, tile_size=256, cache_dir=None, memory_budget=None):
+    """
+    Runs one job, writing its output under a temporary name until it is complete.
+
+    Args:
+        job (dict): Normalised job.
+        stacks (StackCache): Stacks shared between jobs.
+        workers (int, optional): Number of worker processes per job. Defaults to 1.
+        tile_size (int, optional): Height and width of the processing tiles. Defaults to 256.
+        cache_dir (str, optional): Directory of the fitted-parameter cache. Defaults to None.
+        memory_budget (int, optional): Bytes of stack read per window when streaming. Defaults to None.
+    """
+    stack = None
+    if cache_dir is None and memory_budget is None:
+        stack = stacks.get(job['folder_path'], job['tempfill_type'], get_sensor(job))
+
+    output_dir = os.path.dirname(os.path.abspath(job['output_path']))
+    os.makedirs(output_dir, exist_ok=True)
+    partial_path = job['output_path'] + '.partial.tif'
+    main_function.main(job['folder_path'], job['input_file_path'], job['date'], job['window_radius'], partial_path,
+                       job['tempfill_type'], job['time_of_day'], workers=workers, tile_size=tile_size,
+                       cache_dir=cache_dir, memory_budget=memory_budget, stack=stack, sensor=get_sensor(job))
+    os.replace(partial_path, job['output_path'])
+
+def run_batch(manifest_path, jobs=1, workers=1, tile_size=256, cache_dir=None, memory_budget=None,
+              state_path=None, force=False, max_stacks=2):
+    """
+    Runs every job of a manifest in one process.
+
+    Jobs whose output exists and whose settings and input files are unchanged
+    since their last successful run are skipped, so an interrupted batch
+    resumes where it stopped.
+
+    Args:
+        manifest_path (str): Path to the manifest file (JSON, CSV or YAML).
+        jobs (int, optional): Number of jobs run concurrently. Defaults to 1.
+        workers (int, optional): Number of worker processes per job. Defaults to 1.
+        tile_size (int, optional): Height and width of the processing tiles. Defaults to 256.
+        cache_dir (str, optional): Directory of the fitted-parameter cache. Defaults to None.
+        memory_budget (int, optional): Bytes of stack read per window when streaming. Defaults to None.
+        state_path (str, optional): Path of the file recording finished jobs. Defaults to the manifest path + '.state.json'.
+        force (bool, optional): Rerun jobs that are up to date. Defaults to False.
+        max_stacks (int, optional): Number of stacks kept in memory. Defaults to 2.
+
+    Returns:
+        dict: Number of jobs 'done', 'skipped' and 'failed'.
+    """
+    all_jobs = batch_handler.read_manifest(manifest_path)
+    outputs = [os.path.abspath(job['output_path']) for job in all_jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"{manifest_path}: several jobs write the same output_path")
+
+    state_path = state_path or manifest_path + '.state.json'
+    state = read_state(state_path)
+    state_lock = threading.Lock()
+    summary = {'done': 0, 'skipped': 0, 'failed': 0}
+
+    pending = []
+    for job in all_jobs:
+        try:
+            fingerprint = job_fingerprint(job)
+        except Exception:
+            # e.g. a missing folder, which only fails this job
+            summary['failed'] += 1
+            logging.exception(f"Job {job['output_path']} failed")
+            continue
+        if not force and state.get(job['output_path']) == fingerprint and os.path.exists(job['output_path']):
+            summary['skipped'] += 1
+            logging.info(f"Skipping up-to-date job {job['output_path']}")
+        else:
+            pending.append((job, fingerprint))
+
+    # Jobs of the same folder run next to each other so their stack stays cached
+    pending.sort(key=lambda item: (os.path.abspath(item[0]['folder_path']), item[0]['tempfill_type'], item[0]['sensor'] or ''))
+    stacks = StackCache(max_stacks)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {pool.submit(run_job, job, stacks, workers, tile_size, cache_dir, memory_budget): (job, fingerprint)
+                   for job, fingerprint in pending}
+        for future in as_completed(futures):
+            job, fingerprint = futures[future]
+            try:
+                future.result()
+            except Exception:
+                summary['failed'] += 1
+                logging.exception(f"Job {job['output_path']} failed")
+                continue
+            summary['done'] += 1
+            with state_lock:
+                state[job['output_path']] = fingerprint
+                write_state(state_path, state)
+
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruct missing LST pixels for every job of a manifest.")
+    parser.add_argument('manifest', help="JSON, CSV or YAML manifest of jobs")
+    parser.add_argument('--jobs', type=int, default=1, help="number of jobs run concurrently")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes per job")
+    parser.add_argument('--tile-size', type=int, default=256, help="height and width of the processing tiles")
+    parser.add_argument('--cache-dir', help="directory of the fitted-parameter cache")
+    parser.add_argument('--memory-budget', type=int, help="stream the stack, reading at most this many MiB per window")
+    parser.add_argument('--state', help="file recording finished jobs (default: <manifest>.state.json)")
+    parser.add_argument('--force', action='store_true', help="rerun jobs that are up to date")
+    parser.add_argument('--max-stacks', type=int, default=2, help="number of stacks kept in memory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start_time = time.time()
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    summary = run_batch(args.manifest, args.jobs, args.workers, args.tile_size, args.cache_dir, memory_budget,
+                        args.state, args.force, args.max_stacks)
+    print(f"{summary['done']} jobs done, {summary['skipped']} skipped, {summary['failed']} failed.",
+          f"Processing time: {format_time(time.time() - start_time)}")
+    if summary['failed']:
+        exit(1)
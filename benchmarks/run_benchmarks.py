@@ -0,0 +1,202 @@
+"""
+Benchmarks the tempfil pipeline on synthetic LST stacks.
+
+Every run is compared with benchmarks/baseline.json and fails on a stage
+slower, or an RMSE higher, than the tolerance allows:
+
+    python benchmarks/run_benchmarks.py
+
+The stored baseline holds the default sizes (36 and 434), gap fraction,
+window radius and seed. Regenerate it on the reference machine after an
+intended change of speed or accuracy, and commit it with that change:
+
+    python benchmarks/run_benchmarks.py --save-baseline
+
+Throughputs depend on the machine, so compare runs of a different
+machine with a baseline saved there, e.g. --baseline my_baseline.json.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+from tempfil import (
+    get_acquisition_date,
+    get_hkt_acquisition_time,
+    load_stack,
+    find_missing_mask,
+    predict_atc_array,
+    predict_dtc_array,
+    np_from_tif,
+    m_window,
+    create_georeferenced_tif,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def measure(func, *args, **kwargs):
+    """
+    Runs a function, measuring wall time and peak traced memory.
+
+    Returns:
+        tuple: (result, seconds, peak_megabytes)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def rmse(estimate, truth, where):
+    return float(np.sqrt(np.nanmean((estimate[where] - truth[where]) ** 2)))
+
+def stage(seconds, peak, work, unit):
+    return {'seconds': seconds, 'peak_mb': peak, 'throughput': work / max(seconds, 1e-9), 'unit': unit}
+
+def run_case(kind, size, gap_fraction, window_radius, work_dir, seed=0):
+    """
+    Generates one synthetic stack and times every stage of its reconstruction.
+
+    Args:
+        kind (str): 'annual' or 'diurnal'.
+        size (int): Height and width of the scenes.
+        gap_fraction (float): Fraction of cloud gaps per scene.
+        window_radius (int): Radius of the moving window.
+        work_dir (str): Scratch directory.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        dict: Per-stage seconds, peak memory and throughput, plus the reconstruction RMSE.
+    """
+    folder_path = os.path.join(work_dir, f'{kind}_{size}')
+    if kind == 'annual':
+        case = synthetic.make_atc_stack(folder_path, size, gap_fraction=gap_fraction, seed=seed)
+        parse_key = get_acquisition_date
+    else:
+        case = synthetic.make_dtc_stack(folder_path, size, gap_fraction=gap_fraction, seed=seed)
+        parse_key = get_hkt_acquisition_time
+
+    stages = {}
+    stack, seconds, peak = measure(load_stack, folder_path, parse_key)
+    stages['load'] = stage(seconds, peak, stack.cube.nbytes / 2**20, 'MB/s')
+
+    mask, seconds, peak = measure(find_missing_mask, case['target'], window_radius)
+    stages['mask'] = stage(seconds, peak, mask.size, 'pixels/s')
+
+    if kind == 'annual':
+        base, seconds, peak = measure(predict_atc_array, stack.cube, stack.keys, case['date'], mask)
+    else:
+        base, seconds, peak = measure(predict_dtc_array, stack.cube, stack.keys, case['time'], mask)
+    stages['fit'] = stage(seconds, peak, int(mask.sum()), 'pixels fitted/s')
+
+    ts = np_from_tif(case['target'])
+    gaps = np.isnan(ts)
+    reconstructed, seconds, peak = measure(m_window, ts, base, window_radius)
+    stages['m_window'] = stage(seconds, peak, int(gaps.sum()), 'windows filled/s')
+
+    output_path = os.path.join(work_dir, f'{kind}_{size}_out.tif')
+    _, seconds, peak = measure(lambda: create_georeferenced_tif(case['target'], reconstructed, output_path).FlushCache())
+    stages['write'] = stage(seconds, peak, reconstructed.size * 4 / 2**20, 'MB written/s')
+
+    return {
+        'kind': kind,
+        'size': size,
+        'scenes': stack.cube.shape[2],
+        'gap_fraction': gap_fraction,
+        'window_radius': window_radius,
+        'gap_pixels': int(gaps.sum()),
+        'rmse_gaps': rmse(reconstructed, case['truth'], gaps),
+        'rmse_base': rmse(base, case['truth'], gaps),
+        'stages': stages,
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with a stored baseline.
+
+    Args:
+        results (dict): Results of run_benchmarks.
+        baseline (dict): Stored results.
+        tolerance (float): Allowed relative slowdown or RMSE increase.
+
+    Returns:
+        list: Messages describing the regressions.
+    """
+    regressions = []
+    for name, case in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if case['rmse_gaps'] > reference['rmse_gaps'] * (1 + tolerance):
+            regressions.append(f"{name}: RMSE {case['rmse_gaps']:.3f} K vs {reference['rmse_gaps']:.3f} K")
+        for stage_name, values in case['stages'].items():
+            reference_stage = reference['stages'].get(stage_name)
+            if reference_stage and values['throughput'] < reference_stage['throughput'] / (1 + tolerance):
+                regressions.append(f"{name}/{stage_name}: {values['throughput']:.4g} vs {reference_stage['throughput']:.4g} {values['unit']}")
+    return regressions
+
+def print_results(results, baseline=None):
+    for name, case in results.items():
+        print(f"{name}: {case['scenes']} scenes, {case['gap_pixels']} gap pixels, "
+              f"RMSE {case['rmse_gaps']:.3f} K (base {case['rmse_base']:.3f} K)")
+        for stage_name, values in case['stages'].items():
+            line = f"  {stage_name:9s} {values['seconds']:9.3f} s  {values['peak_mb']:9.1f} MB peak  {values['throughput']:12.4g} {values['unit']}"
+            reference = (baseline or {}).get(name, {}).get('stages', {}).get(stage_name)
+            if reference:
+                line += f"  ({values['throughput'] / reference['throughput']:.2f}x baseline)"
+            print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tempfil pipeline on synthetic LST stacks.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[36, 434], help="scene sizes, e.g. 36 434 1024 4096")
+    parser.add_argument('--kinds', nargs='+', default=['annual', 'diurnal'], choices=['annual', 'diurnal'])
+    parser.add_argument('--gap-fraction', type=float, default=0.2, help="fraction of cloud gaps per scene")
+    parser.add_argument('--window-radius', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="stored baseline to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown or RMSE increase")
+    parser.add_argument('--output', help="write the results as JSON to this path")
+    parser.add_argument('--work-dir', help="keep the synthetic stacks in this directory")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='tempfil_bench_')
+    try:
+        results = {}
+        for kind in args.kinds:
+            for size in args.sizes:
+                results[f'{kind}_{size}'] = run_case(kind, size, args.gap_fraction, args.window_radius, work_dir, args.seed)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        if regressions:
+            exit(1)
@@ -0,0 +1,143 @@
+import os
+import numpy as np
+from datetime import date, timedelta
+from osgeo import gdal, osr
+from scipy.ndimage import gaussian_filter
+
+# No-data values of the Landsat and Himawari products in data/
+LANDSAT_NODATA = 999.0
+HIMAWARI_NODATA = -3.4028230607370965e+38
+
+def smooth_field(shape, low, high, rng, sigma=None):
+    """
+    Generates a spatially smooth random field.
+
+    Args:
+        shape (tuple): (rows, cols) of the field.
+        low (float): Lowest value of the field.
+        high (float): Highest value of the field.
+        rng (numpy.random.Generator): Random generator.
+        sigma (float, optional): Smoothing length in pixels. Defaults to an eighth of the smaller side.
+
+    Returns:
+        numpy.ndarray: Field scaled to [low, high].
+    """
+    sigma = sigma or max(min(shape) / 8, 1)
+    field = gaussian_filter(rng.standard_normal(shape), sigma, mode='reflect')
+    field = (field - field.min()) / max(np.ptp(field), 1e-12)
+    return low + (high - low) * field
+
+def cloud_mask(shape, gap_fraction, rng):
+    """
+    Generates blob-shaped cloud gaps covering about gap_fraction of the image.
+
+    Args:
+        shape (tuple): (rows, cols) of the image.
+        gap_fraction (float): Fraction of pixels to mask.
+        rng (numpy.random.Generator): Random generator.
+
+    Returns:
+        numpy.ndarray: Boolean array, True for cloud gaps.
+    """
+    if gap_fraction <= 0:
+        return np.zeros(shape, dtype=bool)
+    field = gaussian_filter(rng.standard_normal(shape), max(min(shape) / 20, 1), mode='reflect')
+    return field > np.quantile(field, 1 - gap_fraction)
+
+def write_tif(file_path, array, pixel_size=100.0, origin=(800000.0, 2500000.0), epsg=32649):
+    """
+    Writes a float32 GeoTIFF on a UTM grid.
+
+    Args:
+        file_path (str): Output path.
+        array (numpy.ndarray): 2D array of pixel values.
+        pixel_size (float, optional): Pixel size in metres. Defaults to 100.
+        origin (tuple, optional): (x, y) of the upper-left corner. Defaults to (800000, 2500000).
+        epsg (int, optional): EPSG code of the projection. Defaults to 32649.
+    """
+    rows, cols = array.shape
+    dataset = gdal.GetDriverByName('GTiff').Create(file_path, cols, rows, 1, gdal.GDT_Float32, ['TILED=YES'])
+    dataset.SetGeoTransform((origin[0], pixel_size, 0, origin[1], 0, -pixel_size))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    dataset.SetProjection(srs.ExportToWkt())
+    dataset.GetRasterBand(1).WriteArray(array.astype(np.float32))
+    dataset.FlushCache()
+    dataset = None
+
+def make_atc_stack(folder_path, size, n_scenes=24, gap_fraction=0.2, noise=0.5, seed=0):
+    """
+    Writes a Landsat-like annual stack generated from known ATC parameters.
+
+    Scenes are 16 days apart and named like Landsat Collection 2 products.
+    The last scene is the target and keeps its cloud-free truth.
+
+    Args:
+        folder_path (str): Folder to write the scenes to.
+        size (int): Height and width of the scenes.
+        n_scenes (int, optional): Number of scenes. Defaults to 24.
+        gap_fraction (float, optional): Fraction of cloud gaps per scene. Defaults to 0.2.
+        noise (float, optional): Standard deviation of the observation noise in K. Defaults to 0.5.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        dict: 'params' (4, size, size) true A, B, C, D, 'target' path and 'date', and 'truth' of the target.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder_path, exist_ok=True)
+    shape = (size, size)
+    params = np.stack([smooth_field(shape, 8, 14, rng), smooth_field(shape, -1.6, -1.2, rng),
+                       smooth_field(shape, -0.005, 0.005, rng), smooth_field(shape, 290, 300, rng)])
+
+    start = date(2020, 1, 6)
+    for n in range(n_scenes):
+        acquisition_date = start + timedelta(days=16 * n)
+        x = acquisition_date.timetuple().tm_yday
+        truth = params[0] * np.sin(2 * np.pi * x / 365.25 + params[1]) + params[2] * x + params[3]
+        scene = truth + rng.normal(0, noise, shape)
+        scene[cloud_mask(shape, gap_fraction, rng)] = LANDSAT_NODATA
+        file_path = os.path.join(folder_path, f"LC08_L1TP_122044_{acquisition_date:%Y%m%d}_20200912_02_T1.tif")
+        write_tif(file_path, scene)
+
+    return {'params': params, 'target': file_path, 'date': f"{acquisition_date:%Y-%m-%d}", 'truth': truth}
+
+def make_dtc_stack(folder_path, size, gap_fraction=0.2, noise=0.3, seed=0):
+    """
+    Writes a Himawari-like hourly stack of one day generated from known daytime DTC parameters.
+
+    Scenes are named Clip_YYYYMMDD_HHMM.tif in UTC; the 10:00 local-time
+    scene is the target and keeps its cloud-free truth.
+
+    Args:
+        folder_path (str): Folder to write the scenes to.
+        size (int): Height and width of the scenes.
+        gap_fraction (float, optional): Fraction of cloud gaps per scene. Defaults to 0.2.
+        noise (float, optional): Standard deviation of the observation noise in K. Defaults to 0.3.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        dict: 'params' (5, size, size) true T0, Ta, A, tm, tsr, 'target' path and 'time', and 'truth' of the target.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder_path, exist_ok=True)
+    shape = (size, size)
+    params = np.stack([smooth_field(shape, 285, 295, rng), smooth_field(shape, 6, 12, rng), np.zeros(shape),
+                       smooth_field(shape, 12.5, 13.5, rng), smooth_field(shape, 5.5, 6.5, rng)])
+    T0, Ta, _, tm, tsr = params
+    omega = (4 / 3) * (tm - tsr)
+
+    for utc_hour in range(24):
+        hour = (utc_hour + 8) % 24
+        x = hour + 24 if hour < 6 else hour
+        day = T0 + Ta * np.cos(np.pi / omega * (x - tm))
+        # Exponential night-time cooling from the value at 19:00
+        night = T0 + Ta * np.cos(np.pi / omega * (19 - tm)) - 4 * (1 - np.exp(-(x - 19) / 4))
+        truth = day if 6 <= x < 19 else night
+        scene = truth + rng.normal(0, noise, shape)
+        scene[cloud_mask(shape, gap_fraction, rng)] = HIMAWARI_NODATA
+        file_path = os.path.join(folder_path, f"Clip_20221224_{utc_hour:02d}00.tif")
+        write_tif(file_path, scene)
+        if hour == 10:
+            target = {'target': file_path, 'time': '2022-12-24_1000', 'truth': truth}
+
+    return dict(target, params=params)
@@ -1,40 +1,125 @@
 import time
 import logging
+import numpy as np
+from functools import partial
+from datetime import datetime
 from tempfil import (
-    get_atc_array, 
-    get_dtc_array,
-    m_window, 
-    np_from_tif, 
+    get_sensor_profile,
+    default_sensor_profile,
+    get_parse_key,
+    list_stack_files,
+    read_stack,
+    load_stack,
+    load_selected_stack,
+    annual_temperature_cycle,
+    get_atc_parameters,
+    fill_atc_from_neighbours,
+    fit_atc_parameters,
+    get_dtc_parameters,
+    fit_dtc_parameters,
+    dtc_scene_sums,
+    read_dtc_scene_sums,
+    dtc_start_parameters,
+    get_acquisition_hours,
+    evaluate_dtc,
+    find_missing_mask,
+    dilate_mask,
+    predict_atc_array,
+    predict_dtc_array,
+    get_dtc_state,
+    hourly_dtc_cube,
+    predict_dtc_state,
+    HOURLY_SLOTS,
+    get_neighbour_index,
+    fill_from_neighbour_index,
+    select_base_array,
+    reconstruct_tiled,
+    iter_reconstructed_blocks,
+    array_from_tif,
+    get_invalid_mask,
+    LST_DTYPE,
     format_time,
-    create_georeferenced_tif,
+    open_georeferenced_tif,
+    write_block,
+    stage,
+    enable_instrumentation,
+    disable_instrumentation,
+    write_instrumentation_report,
 )
 
-def main(folder_path, input_file_path, date, window_radius, output_path, tempfill_type, time_of_day):
+def main(folder_path, input_file_path, date, window_radius, output_path, tempfill_type, time_of_day, workers=1, tile_size=256, cache_dir=None, memory_budget=None, stack=None,
+         report_path=None, profile=False, trace_memory=False, scene_selection=None, sensor=None, incremental=False,
+         window_days=None, neighbour_index=False):
     """
     Main function to reconstruct missing LST pixels.
 
     Args:
-        folder_path (str): Path to the folder containing Landsat files.
+        folder_path (str): Path to the folder containing LST files.
         input_file_path (str): Path to the input raster file.
         date (str): Date for which to generate LST (required for 'annual').
         window_radius (int): Radius of the surrounding window for missing pixels.
         output_path (str): Output path for the new TIFF file.
         tempfill_type (str): Type of tempfill ('annual' or 'diurnal').
         time_of_day (str): Time of the day for diurnal tempfill (required for 'diurnal').
+        workers (int, optional): Number of worker processes. Defaults to 1.
+        tile_size (int, optional): Height and width of the processing tiles. Defaults to 256.
+        cache_dir (str, optional): Directory of the fitted-parameter cache. Defaults to None (no cache).
+        memory_budget (int, optional): If given, bytes of stack read per window; the stack is then streamed
+            block by block instead of loaded whole. Defaults to None.
+        stack (LstStack, optional): Already loaded stack of folder_path, e.g. shared between batch jobs. Defaults to None.
+        report_path (str, optional): If given, stage timings and fit/fill counters of the run are written
+            to this JSON file. Defaults to None (no instrumentation).
+        profile (bool, optional): Add a cProfile of each stage to the report. Defaults to False.
+        trace_memory (bool, optional): Add the tracemalloc peak of each stage to the report. Defaults to False.
+        scene_selection (dict, optional): For 'annual', keyword arguments of load_selected_stack (nearest_years,
+            seasonal_window, min_observations, min_valid_fraction) to read and fit only the scenes selected
+            for the date; cache_dir then only keeps the scene index. Defaults to None (every scene).
+        sensor (str or SensorProfile, optional): Sensor of the files ('landsat', 'himawari', 'modis' or a
+            SensorProfile), giving the file name pattern, valid ranges, time zone and output CRS.
+            Defaults to None ('landsat' for 'annual', 'himawari' for 'diurnal').
+        incremental (bool, optional): For 'diurnal' with cache_dir, fit running hourly statistics that new
+            scenes update in place (see get_dtc_state) instead of refitting the stack. The 'annual' cache
+            is always updated incrementally. Defaults to False.
+        window_days (float, optional): With incremental, only use the scenes of the last window_days days.
+            Defaults to None (every scene).
+        neighbour_index (bool, optional): For 'annual' with cache_dir, fill the gaps from the cached candidate
+            similar pixels of the date's slot (see get_neighbour_index) instead of searching every window.
+            Defaults to False.
     """
     # Start time for measuring processing time
     start_time = time.time()
 
-    if tempfill_type == 'annual':
-        a = get_atc_array(input_file_path, folder_path, date, window_radius)
-    elif tempfill_type == 'diurnal':
-        a = get_dtc_array(folder_path, time_of_day)
-    else:
+    if tempfill_type not in ('annual', 'diurnal'):
         raise ValueError("Invalid tempfill_type. Supported values are 'annual' or 'diurnal'.")
+    if scene_selection is not None and tempfill_type != 'annual':
+        raise ValueError("scene_selection is only supported for 'annual' tempfill.")
+    if incremental and (tempfill_type != 'diurnal' or cache_dir is None):
+        raise ValueError("incremental is only supported for 'diurnal' tempfill with a cache_dir.")
+    if window_days is not None and not incremental:
+        raise ValueError("window_days requires incremental.")
+    if neighbour_index and (tempfill_type != 'annual' or cache_dir is None or scene_selection is not None):
+        raise ValueError("neighbour_index is only supported for 'annual' tempfill with a cache_dir and no scene_selection.")
+    sensor_profile = get_sensor_profile(sensor) if sensor is not None else default_sensor_profile(tempfill_type)
 
-    Ts_f = np_from_tif(input_file_path)
-    pred_arr = m_window(Ts_f, a, window_radius)
-    create_georeferenced_tif(input_file_path, pred_arr, output_path)
+    if report_path is None:
+        reconstruct(folder_path, input_file_path, date, window_radius, output_path, tempfill_type, time_of_day,
+                    workers, tile_size, cache_dir, memory_budget, stack, scene_selection, sensor_profile, incremental,
+                    window_days, neighbour_index)
+    else:
+        enable_instrumentation(profile, trace_memory)
+        try:
+            reconstruct(folder_path, input_file_path, date, window_radius, output_path, tempfill_type, time_of_day,
+                        workers, tile_size, cache_dir, memory_budget, stack, scene_selection, sensor_profile, incremental,
+                        window_days, neighbour_index)
+        finally:
+            # Written even when the run fails, to show how far it got
+            write_instrumentation_report(disable_instrumentation(), report_path, folder_path=folder_path,
+                                         input_file_path=input_file_path, date=date, time_of_day=time_of_day,
+                                         window_radius=window_radius, tempfill_type=tempfill_type, workers=workers,
+                                         tile_size=tile_size, cache_dir=cache_dir, memory_budget=memory_budget,
+                                         scene_selection=scene_selection, sensor=sensor_profile.name,
+                                         incremental=incremental, window_days=window_days,
+                                         neighbour_index=neighbour_index)
 
     # Calculate processing time
     processing_time_seconds = time.time() - start_time
@@ -44,3 +129,219 @@ def main(folder_path, input_file_path, date, window_radius, output_path, tempfil
     logging.info(f"Processing time: {processing_time_formatted}")
 
     print("missing LST pixels reconstructed successfully.", f"Processing time: {processing_time_formatted}")
+
+def reconstruct(folder_path, input_file_path, date, window_radius, output_path, tempfill_type, time_of_day,
+                workers=1, tile_size=256, cache_dir=None, memory_budget=None, stack=None, scene_selection=None,
+                sensor_profile=None, incremental=False, window_days=None, neighbour_index=False):
+    """
+    Fits the base temperature and writes the reconstructed image, see main for the arguments.
+    """
+    if sensor_profile is None:
+        sensor_profile = default_sensor_profile(tempfill_type)
+    parse_key = get_parse_key(sensor_profile, tempfill_type)
+    valid_range, image_range, nodata = sensor_profile.valid_range, sensor_profile.image_range, sensor_profile.nodata
+
+    if incremental:
+        # Fitting the hourly statistics, updated with the scenes added since the last run
+        state = get_dtc_state(folder_path, cache_dir, parse_key, valid_range, window_days)
+        cube = hourly_dtc_cube(state)
+        # One starting point for every tile, from the hourly means of the whole scene
+        daytime = 6 <= datetime.strptime(time_of_day, '%Y-%m-%d_%H%M').hour < 19
+        p_start = dtc_start_parameters(get_acquisition_hours(HOURLY_SLOTS), daytime,
+                                       *dtc_scene_sums(cube[:, :, :24], weights=cube[:, :, 24:]))
+        predict = partial(predict_dtc_state, time=time_of_day, p_start=p_start)
+    elif cache_dir is not None and scene_selection is None:
+        # Evaluating cached model parameters instead of fitting the stack
+        if tempfill_type == 'annual':
+            day = datetime.strptime(date, '%Y-%m-%d').timetuple().tm_yday
+            params = fill_atc_from_neighbours(get_atc_parameters(folder_path, cache_dir, valid_range, parse_key=parse_key))
+            base_array = annual_temperature_cycle(day, *params)
+        else:
+            daytime = 6 <= datetime.strptime(time_of_day, '%Y-%m-%d_%H%M').hour < 19
+            mask = find_missing_mask(input_file_path, window_radius, *image_range, nodata)
+            params, _ = get_dtc_parameters(folder_path, cache_dir, daytime, mask, parse_key, valid_range)
+            base_array = evaluate_dtc(params, time_of_day)
+        cube, predict = base_array[:, :, None], select_base_array
+    else:
+        if scene_selection is not None:
+            # Reading only the scenes selected for the target date, the gaps only matter to min_observations
+            mask = None
+            if scene_selection.get('min_observations') is not None:
+                mask = find_missing_mask(input_file_path, window_radius, *image_range, nodata)
+            stack = load_selected_stack(folder_path, date, mask, cache_dir=cache_dir, keep_cube=memory_budget is None,
+                                        parse_key=parse_key, **{'valid_range': valid_range, **scene_selection})
+            entries = list(zip(stack.keys, stack.file_paths))
+            keys, cube = stack.keys, stack.cube
+        elif memory_budget is not None:
+            entries = list_stack_files(folder_path, parse_key)
+            keys, cube = [key for key, _ in entries], None
+        else:
+            if stack is None:
+                stack = load_stack(folder_path, parse_key)
+            keys, cube = stack.keys, stack.cube
+        if tempfill_type == 'annual':
+            predict = partial(predict_atc_array, acquisition_dates=keys, date=date, valid_range=valid_range)
+        else:
+            # One starting point for every tile or window, from the scene means of the whole stack
+            daytime = 6 <= datetime.strptime(time_of_day, '%Y-%m-%d_%H%M').hour < 19
+            if cube is None:
+                # Streamed pre-pass over the stack, within the same memory budget
+                sums = read_dtc_scene_sums([file_path for _, file_path in entries], valid_range, memory_budget)
+            else:
+                sums = dtc_scene_sums(cube, valid_range)
+            p_start = dtc_start_parameters(get_acquisition_hours(keys), daytime, *sums)
+            predict = partial(predict_dtc_array, acquisition_times=keys, time=time_of_day, valid_range=valid_range,
+                              p_start=p_start)
+
+    output_tif = open_georeferenced_tif(input_file_path, output_path, nodata=nodata, crs=sensor_profile.crs)
+    if cube is None:
+        # Streaming the stack window by window, each block written as soon as it is reconstructed
+        file_paths = [file_path for _, file_path in entries]
+        for (r0, r1, c0, c1), block in iter_reconstructed_blocks(file_paths, input_file_path, predict, window_radius, memory_budget,
+                                                                 image_range, nodata):
+            write_block(output_tif, block, c0, r0)
+    else:
+        # One float32 copy of the image, with its valid pixels in a boolean mask
+        image = array_from_tif(input_file_path, LST_DTYPE)
+        valid = ~get_invalid_mask(image, *image_range, nodata)
+
+        if neighbour_index:
+            # Sparse gathers over the cached candidates of the date's slot, for the whole scene at once
+            index = get_neighbour_index(folder_path, cache_dir, params, window_radius, ~valid, day, valid_range, parse_key)
+            output = image.copy()
+            centres = np.argwhere(~valid)
+            output[centres[:, 0], centres[:, 1]] = fill_from_neighbour_index(image, base_array, centres, index, valid)
+            write_block(output_tif, output)
+        else:
+            # Writing each tile to the output GeoTIFF as soon as it is reconstructed
+            reconstruct_tiled(cube, image, valid, predict, window_radius, workers, tile_size,
+                              writer=partial(write_block, output_tif))
+    with stage('write'):
+        output_tif.FlushCache()
+        output_tif = None
+
+def main_range(folder_path, start, end, window_radius, output_path, tempfill_type, workers=1, tile_size=256, cache_dir=None,
+               report_path=None, profile=False, trace_memory=False, sensor=None):
+    """
+    Reconstructs missing LST pixels of every scene of a date or time range into one multiband GeoTIFF.
+
+    The stack is loaded once and the model fitted once over the gaps of all
+    the scenes, then evaluated at the date or time of each scene. Band n of
+    the output is the n-th scene of the range in time order, with its date
+    or time as band description.
+
+    Args:
+        folder_path (str): Path to the folder containing LST files.
+        start (str): First date ('annual', format: YYYY-MM-DD) or local time ('diurnal', format: YYYY-MM-DD_HHMM) of the range.
+        end (str): Last date or local time of the range, included.
+        window_radius (int): Radius of the surrounding window for missing pixels.
+        output_path (str): Output path for the multiband TIFF file.
+        tempfill_type (str): Type of tempfill ('annual' or 'diurnal').
+        workers (int, optional): Number of worker processes. Defaults to 1.
+        tile_size (int, optional): Height and width of the processing tiles. Defaults to 256.
+        cache_dir (str, optional): Directory of the fitted-parameter cache; only the scenes of the range are
+            then read. Defaults to None (no cache).
+        report_path (str, optional): If given, stage timings and fit/fill counters of the run are written
+            to this JSON file. Defaults to None (no instrumentation).
+        profile (bool, optional): Add a cProfile of each stage to the report. Defaults to False.
+        trace_memory (bool, optional): Add the tracemalloc peak of each stage to the report. Defaults to False.
+        sensor (str or SensorProfile, optional): Sensor of the files, see main. Defaults to None
+            ('landsat' for 'annual', 'himawari' for 'diurnal').
+
+    Returns:
+        list: Date or time of each band.
+    """
+    start_time = time.time()
+
+    if tempfill_type not in ('annual', 'diurnal'):
+        raise ValueError("Invalid tempfill_type. Supported values are 'annual' or 'diurnal'.")
+    time_format = '%Y-%m-%d' if tempfill_type == 'annual' else '%Y-%m-%d_%H%M'
+    for bound in (start, end):
+        datetime.strptime(bound, time_format)
+    sensor_profile = get_sensor_profile(sensor) if sensor is not None else default_sensor_profile(tempfill_type)
+
+    if report_path is None:
+        labels = reconstruct_range(folder_path, start, end, window_radius, output_path, tempfill_type, workers, tile_size,
+                                   cache_dir, sensor_profile)
+    else:
+        enable_instrumentation(profile, trace_memory)
+        try:
+            labels = reconstruct_range(folder_path, start, end, window_radius, output_path, tempfill_type, workers,
+                                       tile_size, cache_dir, sensor_profile)
+        finally:
+            write_instrumentation_report(disable_instrumentation(), report_path, folder_path=folder_path, start=start,
+                                         end=end, window_radius=window_radius, tempfill_type=tempfill_type,
+                                         workers=workers, tile_size=tile_size, cache_dir=cache_dir,
+                                         sensor=sensor_profile.name)
+
+    processing_time_formatted = format_time(time.time() - start_time)
+    logging.info(f"Processing time: {processing_time_formatted}")
+    print(f"missing LST pixels of {len(labels)} scenes reconstructed successfully.", f"Processing time: {processing_time_formatted}")
+    return labels
+
+def reconstruct_range(folder_path, start, end, window_radius, output_path, tempfill_type, workers=1, tile_size=256,
+                      cache_dir=None, sensor_profile=None):
+    """
+    Fits the model once for the scenes of a range and writes their reconstructed bands, see main_range for the arguments.
+    """
+    if sensor_profile is None:
+        sensor_profile = default_sensor_profile(tempfill_type)
+    parse_key = get_parse_key(sensor_profile, tempfill_type)
+    valid_range, image_range, nodata = sensor_profile.valid_range, sensor_profile.image_range, sensor_profile.nodata
+    annual = tempfill_type == 'annual'
+
+    def to_label(key):
+        return key.strftime('%Y-%m-%d') if annual else datetime.strptime(key, '%Y%m%d_%H%M').strftime('%Y-%m-%d_%H%M')
+
+    entries = list_stack_files(folder_path, parse_key)
+    targets = [t for t, (key, _) in enumerate(entries) if start <= to_label(key) <= end]
+    if not targets:
+        raise ValueError(f"No scenes of {folder_path} between {start} and {end}")
+    labels = [to_label(entries[t][0]) for t in targets]
+
+    if cache_dir is None:
+        stack = load_stack(folder_path, parse_key)
+        images = stack.cube[:, :, targets]
+    else:
+        # The cached parameters stand for the stack, only the scenes of the range are read
+        images = read_stack([entries[t][1] for t in targets])
+    valids = [~get_invalid_mask(images[:, :, k], *image_range, nodata) for k in range(len(targets))]
+    with stage('find_missing_pixels'):
+        needs = [dilate_mask(~valid, window_radius) for valid in valids]
+
+    # One fit per model over the gaps of every scene it is evaluated for
+    if annual:
+        regimes = [None] * len(targets)
+    else:
+        regimes = [6 <= datetime.strptime(label, '%Y-%m-%d_%H%M').hour < 19 for label in labels]
+    params = {}
+    for regime in sorted(set(regimes), key=str):
+        mask = np.logical_or.reduce([need for need, other in zip(needs, regimes) if other == regime])
+        if annual and cache_dir is not None:
+            params[regime] = fill_atc_from_neighbours(get_atc_parameters(folder_path, cache_dir, valid_range, parse_key=parse_key))
+        elif annual:
+            doys = [key.timetuple().tm_yday for key in stack.keys]
+            params[regime] = fit_atc_parameters(stack.cube, doys, mask, valid_range)
+        elif cache_dir is not None:
+            params[regime], _ = get_dtc_parameters(folder_path, cache_dir, regime, mask, parse_key, valid_range)
+        else:
+            params[regime], _ = fit_dtc_parameters(stack.cube, get_acquisition_hours(stack.keys), regime, mask,
+                                                   valid_range=valid_range)
+
+    output_tif = open_georeferenced_tif(entries[targets[0]][1], output_path, bands=len(targets), nodata=nodata,
+                                        crs=sensor_profile.crs, interleave='BAND', descriptions=labels)
+    for k, (label, regime, need) in enumerate(zip(labels, regimes, needs)):
+        base_array = np.zeros(need.shape, dtype=float)
+        if annual:
+            day = datetime.strptime(label, '%Y-%m-%d').timetuple().tm_yday
+            base_array[need] = annual_temperature_cycle(day, *params[regime][:, need])
+        else:
+            base_array[need] = evaluate_dtc(params[regime][:, need], label)
+
+        # Filling the scene tile by tile into its own band
+        reconstruct_tiled(base_array[:, :, None], np.ascontiguousarray(images[:, :, k]), valids[k], select_base_array,
+                          window_radius, workers, tile_size, writer=partial(write_block, output_tif, band=k + 1))
+    with stage('write'):
+        output_tif.FlushCache()
+        output_tif = None
+    return labels
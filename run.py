@@ -1,4 +1,3 @@
-import logging
 import input_handler
 import main_function
 
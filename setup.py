@@ -15,7 +15,7 @@ setup(
     long_description=long_description,
     long_description_content_type='text/markdown',
     packages=find_packages(),
-    install_requires=["numpy", "scipy", "gdal", "pandas",
+    install_requires=["numpy", "scipy", "gdal",
     ],
     extras_require= {
         "dev": ["pytest>=7.0", "twine>=4.0.2"]},
@@ -1,10 +1,14 @@
-import os
-import numpy as np
-from scipy.optimize import curve_fit
-from datetime import datetime
-from osgeo import gdal
-from .base_atc_temp import get_acquisition_date, annual_temperature_cycle, get_best_fit_parameters_and_lst, find_missing_pixels, get_atc_array
-from .base_dtc_temp import get_acquisition_time, utc_to_hkt, daytime_temperature_cycle, nighttime_temperature_cycle, get_dtc_best_fit_parameters_and_lst, get_dtc_array
-from .pred_temp import rec_lst, m_window, create_georeferenced_tif 
-from .utility import format_time, np_from_tif
-
+from .base_atc_temp import get_acquisition_date, annual_temperature_cycle, get_best_fit_parameters_and_lst, atc_normal_equations, solve_atc_normal_equations, fill_atc_from_neighbours, fit_atc_parameters, get_atc_parameters, predict_atc_array, load_selected_stack, find_missing_pixels, get_atc_array
+from .base_dtc_temp import get_acquisition_time, utc_to_local, utc_to_hkt, daytime_temperature_cycle, nighttime_temperature_cycle, get_dtc_best_fit_parameters_and_lst, get_hkt_acquisition_time, get_acquisition_hours, dtc_scene_sums, read_dtc_scene_sums, dtc_start_parameters, fit_dtc_parameters, get_dtc_parameters, evaluate_dtc, predict_dtc_array, get_dtc_array
+from .pred_temp import rec_lst, spatial_distance_weights, fill_missing_centres, m_window, open_georeferenced_tif, write_block, create_georeferenced_tif
+from .utility import LST_DTYPE, format_time, array_from_tif, as_float_array, set_invalid_to_nan, np_from_tif
+from .stack import LstStack, list_stack_files, read_stack, load_stack, raster_shape, read_window, read_stack_window, iter_block_windows
+from .cache import file_signatures, hash_key, cache_path, entry_lock
+from .mask import get_invalid_mask, dilate_mask, find_missing_mask
+from .tiling import FIT_REACH, iter_tiles, select_base_array, reconstruct_tile, reconstruct_tiled, iter_reconstructed_blocks
+from .instrument import enable_instrumentation, disable_instrumentation, instrumentation_enabled, stage, count, take_counters, merge_counters, instrumentation_report, write_instrumentation_report
+from .scene_index import SceneInfo, scene_valid_fraction, build_scene_index, select_scenes, read_selected_scenes
+from .quality import FIT_NONE, FIT_FULL, FIT_REDUCED, FIT_NEIGHBOURS, FitQuality, empty_quality, fill_from_neighbours
+from .sensor import SensorProfile, LANDSAT, HIMAWARI, MODIS, SENSOR_PROFILES, POSITIONAL_DATE_PATTERN, get_sensor_profile, default_sensor_profile, parse_acquisition_datetime, parse_acquisition_date, parse_local_time, get_parse_key
+from .incremental import DtcState, HOURLY_SLOTS, get_dtc_state, hourly_dtc_cube, predict_dtc_state
+from .neighbours import NeighbourIndex, SLOT_DAYS, window_std, slot_reference_days, build_neighbour_rows, build_neighbour_index, get_neighbour_index, fill_from_neighbour_index
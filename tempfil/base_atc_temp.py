@@ -3,6 +3,13 @@ from scipy.optimize import curve_fit
 from datetime import datetime
 import os
 from osgeo import gdal
+from .stack import list_stack_files, read_stack, load_stack
+from .cache import file_signatures, cache_path, read_manifest, write_manifest, clear_manifest, load_array, create_array, commit_arrays, entry_lock
+from .mask import find_missing_mask, dilate_mask
+from .scene_index import build_scene_index, select_scenes, read_selected_scenes
+from .instrument import stage, count, instrumentation_enabled
+from .quality import FIT_NONE, FIT_FULL, FIT_REDUCED, FIT_NEIGHBOURS, empty_quality, fill_from_neighbours
+from .sensor import get_sensor_profile, get_parse_key
 
 def extract_pixel_value(file_path, x, y):
     """
@@ -73,15 +80,346 @@ def get_best_fit_parameters_and_lst(date, pixel_values_dict):
             acquisition_dates_doy.append(datetime.strptime(date_str, '%Y-%m-%d').timetuple().tm_yday)
             pixel_values.append(value)
 
-    # Fitting the temperature cycle model to observed data
-    popt, _ = curve_fit(annual_temperature_cycle, acquisition_dates_doy, pixel_values)
-
-    # Calculating temperature for the specified date
+    # Fitting the temperature cycle model to observed data, falling back to the cycle
+    # without linear trend and then to NaN instead of failing the whole run
     x = datetime.strptime(date, '%Y-%m-%d').timetuple().tm_yday
-    lst_value = annual_temperature_cycle(x, *popt)
+    try:
+        popt, _ = curve_fit(annual_temperature_cycle, acquisition_dates_doy, pixel_values)
+        lst_value = annual_temperature_cycle(x, *popt)
+    except (RuntimeError, TypeError, ValueError):
+        try:
+            popt, _ = curve_fit(lambda x, A, B, D: annual_temperature_cycle(x, A, B, 0, D), acquisition_dates_doy, pixel_values)
+            lst_value = annual_temperature_cycle(x, popt[0], popt[1], 0, popt[2])
+        except (RuntimeError, TypeError, ValueError):
+            lst_value = np.nan
 
     return lst_value
 
+# Terms of the linearised model kept by the reduced harmonic fit (no linear trend)
+REDUCED_TERMS = [0, 1, 3]
+# Largest condition number of a normal matrix accepted as a fit (well-spread dates stay below 100)
+MAX_CONDITION = 1e6
+
+def _atc_design(doys):
+    # Design matrix of the linearised model, with x scaled to years for conditioning
+    x = np.asarray(doys, dtype=float)
+    omega_x = 2 * np.pi * x / 365.25
+    return np.stack([np.sin(omega_x), np.cos(omega_x), x / 365.25, np.ones_like(x)], axis=1)
+
+def atc_normal_equations(values, doys, valid_range=(265, 320)):
+    """
+    Builds the per-pixel normal equations of the linearised annual temperature cycle.
+
+    The model is linear once written as a * sin(wx) + b * cos(wx) + C * x + D,
+    so each pixel reduces to a 4x4 system. Out-of-range values carry zero
+    weight, and the systems of disjoint sets of scenes simply add up.
+
+    Args:
+        values (numpy.ndarray): Pixel values with shape (P, T).
+        doys (list): Day of year of each scene along the time axis.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+
+    Returns:
+        tuple: Flattened normal matrices with shape (P, 16) and right-hand sides with shape (P, 4).
+    """
+    design = _atc_design(doys)
+    outer = (design[:, :, None] * design[:, None, :]).reshape(len(design), 16)
+
+    values = np.asarray(values, dtype=float)
+    weights = (values >= valid_range[0]) & (values <= valid_range[1])  # Filtering valid pixel values
+    w = weights.astype(float)
+    normal = w @ outer
+    rhs = (w * np.where(weights, values, 0)) @ design
+    return normal, rhs
+
+def _solve_atc_coefficients(normal, rhs):
+    normal = np.asarray(normal, dtype=float).reshape(-1, 4, 4)
+    rhs = np.asarray(rhs, dtype=float)
+    inverse = np.full((len(rhs), 4, 4), np.nan)
+    level = np.full(len(rhs), FIT_NONE, dtype=np.int8)
+
+    # Full model from four well-spread observations (the last diagonal term counts them),
+    # the reduced harmonic without linear trend from three
+    counts = normal[:, 3, 3]
+    terms = np.ix_(REDUCED_TERMS, REDUCED_TERMS)
+    full = counts >= 4
+    with np.errstate(divide='ignore', invalid='ignore'):
+        full[full] = np.linalg.cond(normal[full]) < MAX_CONDITION
+        reduced = (counts >= 3) & ~full
+        reduced[reduced] = np.linalg.cond(normal[reduced][:, terms[0], terms[1]]) < MAX_CONDITION
+    inverse[full] = np.linalg.pinv(normal[full])
+    reduced_inverse = np.zeros((np.count_nonzero(reduced), 4, 4))
+    reduced_inverse[:, terms[0], terms[1]] = np.linalg.pinv(normal[reduced][:, terms[0], terms[1]])
+    inverse[reduced] = reduced_inverse
+    level[full], level[reduced] = FIT_FULL, FIT_REDUCED
+
+    coef = np.einsum('pij,pj->pi', inverse, rhs)
+    return coef, level, inverse
+
+def _linear_to_atc(coef):
+    # (a, b, c, d) of the linearised model, along the first axis, to A, B, C, D
+    return np.stack([np.hypot(coef[0], coef[1]), np.arctan2(coef[1], coef[0]), coef[2] / 365.25, coef[3]])
+
+def _atc_to_linear(params):
+    return np.stack([params[0] * np.cos(params[1]), params[0] * np.sin(params[1]), params[2] * 365.25, params[3]])
+
+def _atc_standard_errors(coef, covariance):
+    # Propagating the (P, 4, 4) covariance of the linear coefficients to A, B, C, D
+    a, b = coef[:, 0], coef[:, 1]
+    amplitude_sq = a**2 + b**2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grad_a = np.stack([a, b], axis=1) / np.sqrt(amplitude_sq)[:, None]
+        grad_b = np.stack([-b, a], axis=1) / amplitude_sq[:, None]
+        harmonic = covariance[:, :2, :2]
+        std_error = np.stack([
+            np.sqrt(np.einsum('pi,pij,pj->p', grad_a, harmonic, grad_a)),
+            np.sqrt(np.einsum('pi,pij,pj->p', grad_b, harmonic, grad_b)),
+            np.sqrt(covariance[:, 2, 2]) / 365.25,
+            np.sqrt(covariance[:, 3, 3]),
+        ])
+    return std_error
+
+def solve_atc_normal_equations(normal, rhs):
+    """
+    Solves per-pixel normal equations for the annual temperature cycle parameters.
+
+    Pixels with four or more observations get the full model, pixels with
+    three, or whose dates cannot separate the trend from the cycle, the
+    reduced harmonic without linear trend (C = 0).
+
+    Args:
+        normal (numpy.ndarray): Flattened normal matrices with shape (P, 16).
+        rhs (numpy.ndarray): Right-hand sides with shape (P, 4).
+
+    Returns:
+        numpy.ndarray: Parameters A, B, C, D with shape (4, P), NaN for pixels that cannot be fitted.
+    """
+    coef, _, _ = _solve_atc_coefficients(normal, rhs)
+    return _linear_to_atc(coef.T)
+
+def fill_atc_from_neighbours(params, mask=None, radius=2):
+    """
+    Gives pixels without ATC parameters the mean cycle of the fitted pixels around them.
+
+    Args:
+        params (numpy.ndarray): Parameter grids A, B, C, D with shape (4, rows, cols), NaN where not fitted.
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to fill. Defaults to all pixels.
+        radius (int, optional): Radius of the square neighbourhood. Defaults to 2.
+
+    Returns:
+        numpy.ndarray: Parameter grids with the filled pixels, NaN where no neighbour was fitted.
+    """
+    coef = _atc_to_linear(params)
+    level = np.where(np.isnan(coef[0]), FIT_NONE, FIT_FULL).astype(np.int8)
+    fill_from_neighbours(coef, level, mask, radius)
+    return _linear_to_atc(coef)
+
+def fit_atc_parameters(cube, doys, mask=None, valid_range=(265, 320), chunk_size=65536, neighbour_radius=2,
+                       return_quality=False, count_mask=None):
+    """
+    Fits the annual temperature cycle model to every masked pixel at once.
+
+    Each pixel is solved in closed form by masked least squares over the
+    (pixel, date) matrix, see atc_normal_equations. Pixels go down a
+    fallback chain instead of failing: full model (four or more valid
+    observations), reduced harmonic without linear trend (three), mean
+    cycle of the fitted pixels within neighbour_radius, then NaN.
+
+    Pixels within neighbour_radius of the mask are solved too, so the
+    result of a pixel does not depend on the mask, nor on the tile it is
+    fitted in given that context.
+
+    Args:
+        cube (numpy.ndarray): Stack of pixel values with shape (rows, cols, T).
+        doys (list): Day of year of each scene along the time axis.
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to fit. Defaults to all pixels.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        chunk_size (int, optional): Number of pixels solved per batch. Defaults to 65536.
+        neighbour_radius (int, optional): Radius of the neighbourhood of the last fallback, 0 to skip it. Defaults to 2.
+        return_quality (bool, optional): Also return the quality grids. Defaults to False.
+        count_mask (numpy.ndarray, optional): Boolean (rows, cols) array of the pixels the fits_* counters cover,
+            e.g. the core of a tile whose halo other tiles count; the other pixels solved go to fits_halo.
+            Defaults to the mask.
+
+    Returns:
+        numpy.ndarray: Parameter grids A, B, C, D with shape (4, rows, cols), NaN where not fitted and outside the mask.
+        With return_quality, a (params, FitQuality) tuple: fallback level, number of valid observations
+        and standard error of A, B, C, D (spread of the neighbours' parameters for FIT_NEIGHBOURS).
+    """
+    rows, cols, _ = cube.shape
+    if mask is None:
+        mask = np.ones((rows, cols), dtype=bool)
+    coef_grid = np.full((4, rows, cols), np.nan)
+    quality = empty_quality(4, (rows, cols))
+    design = _atc_design(doys)
+
+    pixel_rows, pixel_cols = np.nonzero(dilate_mask(mask, neighbour_radius))
+    with stage('atc_fit'):
+        for start in range(0, len(pixel_rows), chunk_size):
+            r = pixel_rows[start:start + chunk_size]
+            c = pixel_cols[start:start + chunk_size]
+            values = cube[r, c].astype(float)
+            normal, rhs = atc_normal_equations(values, doys, valid_range)
+            coef, level, inverse = _solve_atc_coefficients(normal, rhs)
+            coef_grid[:, r, c] = coef.T
+            quality.level[r, c] = level
+            quality.n_obs[r, c] = normal[:, 15]
+
+            if return_quality:
+                # Residual variance of each pixel scales the inverse normal matrix to the covariance
+                valid = (values >= valid_range[0]) & (values <= valid_range[1])
+                residuals = np.where(valid, values - coef @ design.T, 0)
+                dof = normal[:, 15] - np.where(level == FIT_FULL, 4, 3)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    variance = np.where(dof > 0, np.sum(residuals**2, axis=1) / dof, np.nan)
+                quality.std_error[:, r, c] = _atc_standard_errors(coef, variance[:, None, None] * inverse)
+
+        filled, spread = fill_from_neighbours(coef_grid, quality.level, mask, neighbour_radius)
+        if return_quality and np.any(filled):
+            spread_cov = np.zeros((np.count_nonzero(filled), 4, 4))
+            spread_cov[:, range(4), range(4)] = spread[:, filled].T**2
+            quality.std_error[:, filled] = _atc_standard_errors(coef_grid[:, filled].T, spread_cov)
+
+        # Dropping the context solved around the mask
+        coef_grid[:, ~mask] = np.nan
+        quality.level[~mask], quality.n_obs[~mask], quality.std_error[:, ~mask] = FIT_NONE, 0, np.nan
+        params = _linear_to_atc(coef_grid)
+
+    if instrumentation_enabled():
+        levels = quality.level[mask if count_mask is None else mask & count_mask]
+        count('fits_attempted', levels.size)
+        count('fits_halo', len(pixel_rows) - levels.size)
+        count('fits_reduced', np.count_nonzero(levels == FIT_REDUCED))
+        count('fits_from_neighbours', np.count_nonzero(levels == FIT_NEIGHBOURS))
+        count('fits_failed', np.count_nonzero(levels == FIT_NONE))
+
+    if return_quality:
+        return params, quality
+    return params
+
+def get_atc_parameters(folder_path, cache_dir, valid_range=(265, 320), block_rows=256, parse_key=get_acquisition_date):
+    """
+    Returns the ATC parameter grids of a stack from an on-disk cache, fitting them if needed.
+
+    The cache keeps the per-pixel normal equations of every pixel. Scenes
+    added to the folder only have their own contribution read and added;
+    removed or modified scenes trigger a full rebuild.
+
+    Args:
+        folder_path (str): Path to the folder containing Landsat files.
+        cache_dir (str): Root directory of the cache.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        block_rows (int, optional): Number of rows processed at once. Defaults to 256.
+        parse_key (callable, optional): Function mapping a file name to its acquisition date,
+            see sensor.get_parse_key. Defaults to get_acquisition_date.
+
+    Returns:
+        numpy.ndarray: Memory-mapped parameter grids A, B, C, D with shape (4, rows, cols).
+    """
+    entries = list_stack_files(folder_path, parse_key)
+    if not entries:
+        raise FileNotFoundError(f"No .tif files found in {folder_path}")
+    file_paths = [file_path for _, file_path in entries]
+    doys = [acquisition_date.timetuple().tm_yday for acquisition_date, _ in entries]
+    signatures = file_signatures(file_paths)
+
+    path = cache_path(cache_dir, folder_path, 'atc', {'valid_range': list(valid_range)})
+    with entry_lock(path):
+        manifest = read_manifest(path)
+        if manifest is not None and sorted(manifest['signatures']) == sorted(signatures):
+            return load_array(path, 'params')
+
+        # Only new scenes are read when every cached scene is still present and unchanged
+        cached = [tuple(signature) for signature in manifest['signatures']] if manifest is not None else []
+        incremental = len(cached) > 0 and set(cached) <= {tuple(signature) for signature in signatures}
+        new = [t for t, signature in enumerate(signatures) if not incremental or tuple(signature) not in cached]
+        cube = read_stack([file_paths[t] for t in new])
+        rows, cols, _ = cube.shape
+
+        clear_manifest(path)
+        normal = create_array(path, 'normal', (rows, cols, 16))
+        rhs = create_array(path, 'rhs', (rows, cols, 4))
+        params = create_array(path, 'params', (4, rows, cols), fill_value=np.nan)
+        if incremental:
+            old_normal, old_rhs = load_array(path, 'normal'), load_array(path, 'rhs')
+        for r0 in range(0, rows, block_rows):
+            r1 = min(r0 + block_rows, rows)
+            block_normal, block_rhs = atc_normal_equations(cube[r0:r1].reshape(-1, len(new)), [doys[t] for t in new], valid_range)
+            block_normal, block_rhs = block_normal.reshape(r1 - r0, cols, 16), block_rhs.reshape(r1 - r0, cols, 4)
+            if incremental:
+                block_normal += old_normal[r0:r1]
+                block_rhs += old_rhs[r0:r1]
+            normal[r0:r1], rhs[r0:r1] = block_normal, block_rhs
+            params[:, r0:r1] = solve_atc_normal_equations(block_normal.reshape(-1, 16), block_rhs.reshape(-1, 4)).reshape(4, r1 - r0, cols)
+        for array in (normal, rhs, params):
+            array.flush()
+        del normal, rhs, params
+        if incremental:
+            del old_normal, old_rhs
+
+        commit_arrays(path, ['normal', 'rhs', 'params'])
+        write_manifest(path, {'folder_path': os.path.abspath(folder_path), 'valid_range': list(valid_range), 'signatures': signatures})
+        return load_array(path, 'params')
+
+def predict_atc_array(cube, acquisition_dates, date, mask=None, return_quality=False, valid_range=(265, 320), count_mask=None):
+    """
+    Fits the ATC model over the masked pixels of a stack and evaluates it on a date.
+
+    Args:
+        cube (numpy.ndarray): Stack of pixel values with shape (rows, cols, T).
+        acquisition_dates (list): Acquisition date of each scene along the time axis.
+        date (str): Date for which to generate LST (format: YYYY-MM-DD).
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to fit. Defaults to all pixels.
+        return_quality (bool, optional): Also return the FitQuality grids, see fit_atc_parameters. Defaults to False.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        count_mask (numpy.ndarray, optional): Pixels the fit counters cover, see fit_atc_parameters. Defaults to the mask.
+
+    Returns:
+        numpy.ndarray: Array of ATC base LST values, zero outside the mask (and the FitQuality with return_quality).
+    """
+    rows, cols = cube.shape[:2]
+    if mask is None:
+        mask = np.ones((rows, cols), dtype=bool)
+    doys = [acquisition_date.timetuple().tm_yday for acquisition_date in acquisition_dates]
+
+    atc_array = np.zeros((rows, cols), dtype=float)  # Array for storing LST values
+    if return_quality:
+        params, quality = fit_atc_parameters(cube, doys, mask, valid_range, return_quality=True, count_mask=count_mask)
+    else:
+        params = fit_atc_parameters(cube, doys, mask, valid_range, count_mask=count_mask)
+    x = datetime.strptime(date, '%Y-%m-%d').timetuple().tm_yday
+    atc_array[mask] = annual_temperature_cycle(x, *params[:, mask])
+
+    if return_quality:
+        return atc_array, quality
+    return atc_array
+
+def load_selected_stack(folder_path, date, mask=None, nearest_years=None, seasonal_window=None, min_observations=None,
+                        min_valid_fraction=0.0, valid_range=(265, 320), cache_dir=None, keep_cube=True,
+                        parse_key=get_acquisition_date):
+    """
+    Reads only the scenes of a folder selected for a target date, see select_scenes and read_selected_scenes.
+
+    Args:
+        folder_path (str): Path to the folder containing Landsat files.
+        date (str): Target date (format: YYYY-MM-DD).
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to be fitted. Defaults to all pixels.
+        nearest_years (int, optional): Keep the scenes of the K years closest to the target year. Defaults to None.
+        seasonal_window (int, optional): Keep scenes within this many days of the target day of year. Defaults to None.
+        min_observations (int, optional): Stop reading once every masked pixel has this many valid observations. Defaults to None.
+        min_valid_fraction (float, optional): Leave out scenes with fewer valid pixels. Defaults to 0.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        cache_dir (str, optional): Directory where the scene index is kept. Defaults to None.
+        keep_cube (bool, optional): Whether to return the pixel values, or only the chosen scenes. Defaults to True.
+        parse_key (callable, optional): Function mapping a file name to its acquisition date. Defaults to get_acquisition_date.
+
+    Returns:
+        LstStack: Stack of the selected scenes, in time order.
+    """
+    index = build_scene_index(folder_path, parse_key, valid_range, cache_dir)
+    scenes = select_scenes(index, date, nearest_years, seasonal_window, min_valid_fraction)
+    return read_selected_scenes(scenes, mask, min_observations, valid_range, keep_cube)
+
 def find_missing_pixels(input_file_path, window_radius):
     """
     Identifies missing pixels in a raster file and returns surrounding window.
@@ -93,28 +431,10 @@ def find_missing_pixels(input_file_path, window_radius):
     Returns:
         list: List of coordinates representing the surrounding window of missing pixels.
     """
-    input_dataset = gdal.Open(input_file_path)
-    input_array = input_dataset.GetRasterBand(1).ReadAsArray()
-    missing_pixels = set()
-    surrounding_window = set()
-
-    rows, cols = input_array.shape
-
-    # Iterating through the input array to identify missing pixels
-    for i in range(rows):
-        for j in range(cols):
-            if input_array[i, j] < 12 or input_array[i, j] > 400:  # Checking pixel value range
-                missing_pixels.add((i, j))
-                for x in range(max(0, i - window_radius), min(rows, i + window_radius + 1)):
-                    for y in range(max(0, j - window_radius), min(cols, j + window_radius + 1)):
-                        surrounding_window.add((x, y))
+    # Original range of this helper, pixels from 12 K count as valid
+    return np.argwhere(find_missing_mask(input_file_path, window_radius, low=12)).tolist()
 
-    # Converting set to list with 2D array representation
-    surrounding_window = [[index[0], index[1]] for index in surrounding_window]
-
-    return surrounding_window
-
-def get_atc_array(input_file_path, folder_path, date, window_radius):
+def get_atc_array(input_file_path, folder_path, date, window_radius, cache_dir=None, scene_selection=None, sensor='landsat'):
     """
     Generates an array of Land Surface Temperature (LST) using the Annual Temperature Cycle (ATC) model.
 
@@ -123,38 +443,40 @@ def get_atc_array(input_file_path, folder_path, date, window_radius):
         folder_path (str): Path to the folder containing Landsat files.
         date (str): Date for which to generate LST.
         window_radius (int): Radius of the surrounding window for missing pixels.
+        cache_dir (str, optional): Directory of the fitted-parameter cache, see get_atc_parameters. Defaults to None (no cache).
+        scene_selection (dict, optional): Keyword arguments of load_selected_stack (e.g. nearest_years, seasonal_window,
+            min_observations) to fit only the scenes selected for the date. The cache directory then only keeps
+            the scene index. Defaults to None (every scene).
+        sensor (str or SensorProfile, optional): Sensor of the files, see get_sensor_profile. Defaults to 'landsat'.
 
     Returns:
         numpy.ndarray: Array of ATC base LST values.
     """
-    # Getting dimensions from the first available Landsat file
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.tif'):
-            file_path = os.path.join(folder_path, file_name)
-            dataset = gdal.Open(file_path)
-            rows = dataset.RasterYSize
-            cols = dataset.RasterXSize
-            break
-
-    atc_array = np.zeros((rows, cols), dtype=float)  # Array for storing LST values
+    profile = get_sensor_profile(sensor)
+    parse_key = get_parse_key(profile, 'annual')
+
+    if scene_selection is not None:
+        # Fitting only the scenes selected for the target date
+        mask = find_missing_mask(input_file_path, window_radius, *profile.image_range, profile.nodata)
+        stack = load_selected_stack(folder_path, date, mask, cache_dir=cache_dir, parse_key=parse_key,
+                                    **{'valid_range': profile.valid_range, **scene_selection})
+        return predict_atc_array(stack.cube, stack.keys, date, mask, valid_range=profile.valid_range)
+
+    if cache_dir is not None:
+        # Evaluating the cached parameters in closed form
+        mask = find_missing_mask(input_file_path, window_radius, *profile.image_range, profile.nodata)
+        params = fill_atc_from_neighbours(get_atc_parameters(folder_path, cache_dir, profile.valid_range,
+                                                             parse_key=parse_key), mask)
+        atc_array = np.zeros(mask.shape, dtype=float)
+        x = datetime.strptime(date, '%Y-%m-%d').timetuple().tm_yday
+        atc_array[mask] = annual_temperature_cycle(x, *params[:, mask])
+        return atc_array
+
+    # Loading the time series once, sorted by acquisition date
+    stack = load_stack(folder_path, parse_key)
 
     # Finding missing pixels and their surrounding window
-    missing_pixels = find_missing_pixels(input_file_path, window_radius)
+    mask = find_missing_mask(input_file_path, window_radius, *profile.image_range, profile.nodata)
 
-    # Generating LST values for missing pixels
-    for index in missing_pixels:
-        x, y = index
-        pixel_values_dict = {}
-
-        # Extracting pixel values for different acquisition dates
-        for file_name in os.listdir(folder_path):
-            if file_name.endswith('.tif'):
-                file_path = os.path.join(folder_path, file_name)
-                acquisition_date = get_acquisition_date(file_name)
-                pixel_value = extract_pixel_value(file_path, x, y)
-                pixel_values_dict[str(acquisition_date)] = pixel_value
-
-        # Getting LST value using the ATC model
-        atc_array[x, y] = get_best_fit_parameters_and_lst(date, pixel_values_dict)
-
-    return atc_array
+    # Fitting all missing pixels at once and evaluating the ATC model on the date
+    return predict_atc_array(stack.cube, stack.keys, date, mask, valid_range=profile.valid_range)
@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Temporary files of the arrays made by create_array in this process, by (entry path, array name)
+_pending = {}
+
+def file_signatures(file_paths):
+    """
+    Describes files by name, size and modification time.
+
+    Args:
+        file_paths (list): Paths to the files.
+
+    Returns:
+        list: [file_name, size, mtime_ns] of each file.
+    """
+    signatures = []
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        signatures.append([os.path.basename(file_path), stat.st_size, stat.st_mtime_ns])
+    return signatures
+
+def hash_key(obj):
+    """
+    Hashes a JSON-serialisable object.
+
+    Args:
+        obj: Object to hash.
+
+    Returns:
+        str: Hex digest of the object.
+    """
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode('utf-8')).hexdigest()
+
+def cache_path(cache_dir, folder_path, kind, settings):
+    """
+    Returns (and creates) the cache directory of a stack, model and settings.
+
+    Args:
+        cache_dir (str): Root directory of the cache.
+        folder_path (str): Path to the folder containing the stack.
+        kind (str): Name of the cached model, e.g. 'atc'.
+        settings (dict): Settings the cached values depend on, e.g. validity thresholds.
+
+    Returns:
+        str: Path to the cache entry.
+    """
+    path = os.path.join(cache_dir, f"{kind}_{hash_key([os.path.abspath(folder_path), kind, settings])[:16]}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+@contextmanager
+def entry_lock(path):
+    """
+    Holds an exclusive lock on a cache entry, so processes sharing a cache directory
+    build and commit its arrays one at a time.
+
+    Args:
+        path (str): Path to the cache entry.
+    """
+    with open(os.path.join(path, 'lock'), 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _temporary_file(path, name):
+    # Unique name in the entry, so interrupted or concurrent writers never share a file
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=path)
+    os.close(fd)
+    return tmp_path
+
+def read_manifest(path):
+    """
+    Reads the manifest of a cache entry.
+
+    Args:
+        path (str): Path to the cache entry.
+
+    Returns:
+        dict: Manifest, or None if the entry is empty or was left incomplete.
+    """
+    try:
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(path, manifest):
+    """
+    Atomically writes the manifest of a cache entry, marking its arrays as complete.
+
+    Args:
+        path (str): Path to the cache entry.
+        manifest (dict): Manifest to write.
+    """
+    tmp_path = _temporary_file(path, 'manifest.json')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(path, 'manifest.json'))
+
+def clear_manifest(path):
+    """
+    Removes the manifest of a cache entry before its arrays are rewritten.
+
+    Args:
+        path (str): Path to the cache entry.
+    """
+    try:
+        os.remove(os.path.join(path, 'manifest.json'))
+    except FileNotFoundError:
+        pass
+
+def load_array(path, name, mode='r'):
+    """
+    Memory-maps a cached array.
+
+    Args:
+        path (str): Path to the cache entry.
+        name (str): Name of the array.
+        mode (str, optional): Memory-map mode. Defaults to 'r'.
+
+    Returns:
+        numpy.memmap: Cached array.
+    """
+    return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode)
+
+def create_array(path, name, shape, dtype=float, fill_value=0):
+    """
+    Creates a memory-mapped array under a unique temporary name, see commit_arrays.
+
+    Args:
+        path (str): Path to the cache entry.
+        name (str): Name of the array.
+        shape (tuple): Shape of the array.
+        dtype (numpy.dtype, optional): Data type of the array. Defaults to float.
+        fill_value (optional): Initial value. Defaults to 0.
+
+    Returns:
+        numpy.memmap: Writable array.
+    """
+    tmp_path = _temporary_file(path, name)
+    _pending[(path, name)] = tmp_path
+    array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+    array[...] = fill_value
+    return array
+
+def commit_arrays(path, names):
+    """
+    Moves arrays made by create_array to their final names.
+
+    The arrays must have been flushed and released by the caller first,
+    within the entry_lock the arrays were built under.
+
+    Args:
+        path (str): Path to the cache entry.
+        names (list): Names of the arrays.
+    """
+    for name in names:
+        os.replace(_pending.pop((path, name)), os.path.join(path, f'{name}.npy'))
@@ -0,0 +1,133 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+from .stack import list_stack_files
+from .cache import file_signatures, cache_path, read_manifest, write_manifest, clear_manifest, load_array, create_array, commit_arrays, entry_lock
+from .base_dtc_temp import get_hkt_acquisition_time, predict_dtc_array
+from .utility import LST_DTYPE, array_from_tif
+from .instrument import stage
+
+# Running statistics of a diurnal stack: sums and counts of the valid values of every pixel in each
+# hour of the day, both with shape (24, rows, cols). The DTC models only see the hour of a scene, so
+# fitting the hourly means weighted by their counts gives the same least-squares fit as the scenes.
+DtcState = namedtuple('DtcState', ['sums', 'counts'])
+
+# Acquisition time (HHMM) of each hourly slot, as read by get_acquisition_hours
+HOURLY_SLOTS = [f'{hour:02d}00' for hour in range(24)]
+
+def _slot(key):
+    return int(key[-4:-2])
+
+def get_dtc_state(folder_path, cache_dir, parse_key=get_hkt_acquisition_time, valid_range=(260, np.inf), window_days=None):
+    """
+    Returns the running hourly statistics of a diurnal stack, updating them for the scenes that changed.
+
+    New scenes are added and scenes leaving the rolling window are
+    subtracted, one band each, so an update costs O(pixels) per scene
+    whatever the length of the history. Scenes removed or modified on disk
+    cannot be subtracted and trigger a rebuild.
+
+    Args:
+        folder_path (str): Path to the folder containing LST files.
+        cache_dir (str): Root directory of the cache.
+        parse_key (callable, optional): Function mapping a file name to its local acquisition time
+            (format: YYYYMMDD_HHMM), see sensor.get_parse_key. Defaults to get_hkt_acquisition_time.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (260, inf).
+        window_days (float, optional): Only keep the scenes of the last window_days days before the
+            latest scene of the folder. Defaults to None (every scene).
+
+    Returns:
+        DtcState: Memory-mapped hourly sums and counts.
+    """
+    entries = list_stack_files(folder_path, parse_key)
+    if not entries:
+        raise FileNotFoundError(f"No .tif files found in {folder_path}")
+    signatures = file_signatures([file_path for _, file_path in entries])
+    present = {tuple(signature): entry for entry, signature in zip(entries, signatures)}
+    wanted = dict(present)
+    if window_days is not None:
+        start = datetime.strptime(entries[-1][0], '%Y%m%d_%H%M') - timedelta(days=window_days)
+        wanted = {signature: entry for signature, entry in present.items() if datetime.strptime(entry[0], '%Y%m%d_%H%M') > start}
+
+    path = cache_path(cache_dir, folder_path, 'dtc_state', {'valid_range': list(valid_range), 'window_days': window_days})
+    with entry_lock(path):
+        manifest = read_manifest(path)
+        kept = {tuple(signature) for signature in manifest['signatures']} if manifest is not None else set()
+        if kept == set(wanted):
+            return DtcState(load_array(path, 'sums'), load_array(path, 'counts'))
+
+        # Scenes leaving the window are read again to be subtracted, which needs them unchanged on disk
+        incremental = manifest is not None and kept <= set(present)
+        if not incremental:
+            kept = set()
+        updates = [(signature, 1) for signature in wanted if signature not in kept]
+        updates += [(signature, -1) for signature in kept if signature not in wanted]
+        updates.sort(key=lambda update: present[update[0]][0])
+
+        sums = counts = None
+        with stage('stack_load'):
+            for signature, sign in updates:
+                key, file_path = present[signature]
+                band = array_from_tif(file_path).astype(float)
+                if sums is None:
+                    rows, cols = band.shape
+                    clear_manifest(path)
+                    sums = create_array(path, 'sums', (24, rows, cols))
+                    counts = create_array(path, 'counts', (24, rows, cols), dtype=np.int32)
+                    if incremental:
+                        sums[...], counts[...] = load_array(path, 'sums'), load_array(path, 'counts')
+                if band.shape != sums.shape[1:]:
+                    raise ValueError(f"{file_path} has shape {band.shape}, expected {sums.shape[1:]}")
+                with np.errstate(invalid='ignore'):
+                    valid = (band >= valid_range[0]) & (band <= valid_range[1])
+                slot = _slot(key)
+                sums[slot] += sign * np.where(valid, band, 0)
+                counts[slot] += sign * valid.astype(np.int32)
+
+        for array in (sums, counts):
+            array.flush()
+        del sums, counts
+        commit_arrays(path, ['sums', 'counts'])
+        write_manifest(path, {'folder_path': os.path.abspath(folder_path), 'window_days': window_days,
+                              'signatures': [list(signature) for signature in wanted]})
+        return DtcState(load_array(path, 'sums'), load_array(path, 'counts'))
+
+def hourly_dtc_cube(state):
+    """
+    Stacks the hourly means and counts of a DtcState into one cube, ready for tiling.
+
+    Args:
+        state (DtcState): Hourly sums and counts, see get_dtc_state.
+
+    Returns:
+        numpy.ndarray: Cube with shape (rows, cols, 48): the mean of each hour (NaN without
+            observations) followed by the number of observations of each hour.
+    """
+    _, rows, cols = state.sums.shape
+    cube = np.empty((rows, cols, 48), dtype=LST_DTYPE)
+    for slot in range(24):
+        counts = state.counts[slot]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cube[:, :, slot] = np.where(counts > 0, state.sums[slot] / counts, np.nan)
+        cube[:, :, 24 + slot] = counts
+    return cube
+
+def predict_dtc_state(cube, time, mask=None, return_quality=False, p_start=None, count_mask=None):
+    """
+    Fits the DTC model to the hourly means of the masked pixels and evaluates it at a time of day.
+
+    Args:
+        cube (numpy.ndarray): Hourly means and counts with shape (rows, cols, 48), see hourly_dtc_cube.
+        time (str): Time of day for which to generate LST (format: YYYY-MM-DD_HHMM).
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to fit. Defaults to all pixels.
+        return_quality (bool, optional): Also return the FitQuality grids, see fit_dtc_parameters. Defaults to False.
+        p_start (numpy.ndarray, optional): Starting parameters of the fits, see dtc_start_parameters.
+            Defaults to the fit of the hourly means of the whole cube.
+        count_mask (numpy.ndarray, optional): Pixels the fit counters cover, see fit_dtc_parameters. Defaults to the mask.
+
+    Returns:
+        numpy.ndarray: Array of DTC base LST values, zero outside the mask (and the FitQuality with return_quality).
+    """
+    return predict_dtc_array(cube[:, :, :24], HOURLY_SLOTS, time, mask, return_quality, weights=cube[:, :, 24:],
+                             p_start=p_start, count_mask=count_mask)
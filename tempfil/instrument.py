@@ -0,0 +1,199 @@
+import io
+import json
+import time
+import pstats
+import threading
+import cProfile
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Record of the current run of each thread, so concurrent runs (e.g. the jobs
+# of batch_run) keep their own numbers; run is None while disabled
+_local = threading.local()
+_disabled_stage = nullcontext()
+
+def _current_run():
+    return getattr(_local, 'run', None)
+
+def enable_instrumentation(profile=False, trace_memory=False):
+    """
+    Starts recording stage timers and counters for a run.
+
+    While disabled, stage() and count() return immediately, so the
+    instrumented code runs at its normal speed. Runs are per thread, while
+    tracemalloc peaks are process-wide and include the allocations of any
+    other thread tracing memory at the same time.
+
+    Args:
+        profile (bool, optional): Capture a cProfile of every stage. Defaults to False.
+        trace_memory (bool, optional): Record the tracemalloc peak of every stage. Defaults to False.
+    """
+    _local.run = {
+        'started': time.time(),
+        'profile': profile,
+        'trace_memory': trace_memory,
+        'stages': defaultdict(lambda: {'calls': 0, 'seconds': 0.0}),
+        'counters': defaultdict(int),
+        'profilers': {},
+        'profiling': False,
+        'peaks': [],
+        'started_tracing': trace_memory and not tracemalloc.is_tracing(),
+    }
+    if _local.run['started_tracing']:
+        tracemalloc.start()
+
+def disable_instrumentation():
+    """
+    Stops recording and returns the report of the run.
+
+    Returns:
+        dict: Report of the run, see instrumentation_report. None if instrumentation was not enabled.
+    """
+    run = _current_run()
+    if run is None:
+        return None
+    report = instrumentation_report()
+    if run['started_tracing'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _local.run = None
+    return report
+
+def instrumentation_enabled():
+    return _current_run() is not None
+
+def stage(name):
+    """
+    Context manager timing one stage of the pipeline, e.g. 'fit' or 'write'.
+
+    Calls of the same stage add up. Nested stages are timed independently.
+
+    Args:
+        name (str): Name of the stage.
+
+    Returns:
+        contextmanager: Context timing the stage, or a no-op context while disabled.
+    """
+    run = _current_run()
+    if run is None:
+        return _disabled_stage
+    return _timed_stage(run, name)
+
+@contextmanager
+def _timed_stage(run, name):
+    record = run['stages'][name]
+    # Only the outermost profiled stage runs a profiler, nested stages show up in its profile
+    profiler = None
+    if run['profile'] and not run['profiling']:
+        profiler = run['profilers'].setdefault(name, cProfile.Profile())
+        run['profiling'] = True
+    peaks = run['peaks']
+    if run['trace_memory']:
+        # Each open stage keeps the peak reached before a nested stage resets it
+        if peaks:
+            peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        peaks.append(0)
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            run['profiling'] = False
+        record['calls'] += 1
+        record['seconds'] += time.perf_counter() - start
+        if run['trace_memory']:
+            peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            record['peak_mb'] = max(record.get('peak_mb', 0.0), peak / 2**20)
+
+def count(name, n=1):
+    """
+    Adds n to a counter of the run, e.g. 'fits_attempted' or 'pixels_filled'.
+
+    Args:
+        name (str): Name of the counter.
+        n (int, optional): Increment. Defaults to 1.
+    """
+    run = _current_run()
+    if run is None:
+        return
+    run['counters'][name] += int(n)
+
+def take_counters():
+    """
+    Returns the stage timers and counters recorded so far and resets them.
+
+    Used by worker processes to send their numbers back with each result.
+
+    Returns:
+        dict: 'stages' and 'counters' recorded since the last call, None while disabled.
+    """
+    run = _current_run()
+    if run is None:
+        return None
+    taken = {'stages': dict(run['stages']), 'counters': dict(run['counters'])}
+    run['stages'].clear()
+    run['counters'].clear()
+    return taken
+
+def merge_counters(taken):
+    """
+    Adds the numbers returned by take_counters in another process to the current run.
+
+    Args:
+        taken (dict): Result of take_counters, or None.
+    """
+    run = _current_run()
+    if run is None or taken is None:
+        return
+    for name, values in taken['stages'].items():
+        record = run['stages'][name]
+        record['calls'] += values['calls']
+        record['seconds'] += values['seconds']
+        if 'peak_mb' in values:
+            record['peak_mb'] = max(record.get('peak_mb', 0.0), values['peak_mb'])
+    for name, value in taken['counters'].items():
+        run['counters'][name] += value
+
+def instrumentation_report():
+    """
+    Builds the report of the current run.
+
+    Stage seconds of worker processes are summed, so with several workers
+    they can exceed the wall time of the run.
+
+    Returns:
+        dict: 'wall_seconds', per-stage 'stages', 'counters' and, when profiling, 'profiles'. None while disabled.
+    """
+    run = _current_run()
+    if run is None:
+        return None
+    report = {
+        'wall_seconds': time.time() - run['started'],
+        'stages': {name: dict(values) for name, values in run['stages'].items()},
+        'counters': dict(run['counters']),
+    }
+    if run['profile']:
+        report['profiles'] = {}
+        for name, profiler in run['profilers'].items():
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(25)
+            report['profiles'][name] = stream.getvalue()
+    return report
+
+def write_instrumentation_report(report, output_path, **run_info):
+    """
+    Writes a run report as JSON.
+
+    Args:
+        report (dict): Report returned by instrumentation_report or disable_instrumentation.
+        output_path (str): Path of the JSON file.
+        **run_info: Settings of the run stored next to the report, e.g. input_file_path.
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(run_info, **report), f, indent=1, default=str)
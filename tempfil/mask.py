@@ -0,0 +1,60 @@
+import numpy as np
+from osgeo import gdal
+from scipy.ndimage import maximum_filter1d
+from .instrument import stage
+
+def get_invalid_mask(array, low=200, high=400, nodata=None):
+    """
+    Builds the mask of invalid pixels of an LST array.
+
+    Args:
+        array (numpy.ndarray): Input 2D array representing pixel values.
+        low (float, optional): Lowest valid pixel value. Defaults to 200.
+        high (float, optional): Highest valid pixel value. Defaults to 400.
+        nodata (float, optional): No-data value of the raster, invalid even within the range. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Boolean array, True where the pixel is out of range, no data or not finite.
+    """
+    with np.errstate(invalid='ignore'):
+        invalid = (array < low) | (array > high) | ~np.isfinite(array)
+    if nodata is not None:
+        invalid |= array == nodata
+    return invalid
+
+def dilate_mask(mask, window_radius):
+    """
+    Grows a mask by a square window using a separable running maximum.
+
+    Args:
+        mask (numpy.ndarray): Boolean 2D array.
+        window_radius (int): Radius of the square window.
+
+    Returns:
+        numpy.ndarray: Boolean array, True within window_radius pixels of a True pixel.
+    """
+    if window_radius <= 0:
+        return mask.copy()
+    size = 2 * window_radius + 1
+    dilated = maximum_filter1d(mask.view(np.uint8), size, axis=0, mode='constant', cval=0)
+    dilated = maximum_filter1d(dilated, size, axis=1, mode='constant', cval=0)
+    return dilated.astype(bool)
+
+def find_missing_mask(input_file_path, window_radius, low=200, high=400, nodata=None):
+    """
+    Identifies missing pixels in a raster file together with their surrounding window.
+
+    Args:
+        input_file_path (str): Path to the input raster file.
+        window_radius (int): Radius of the surrounding window.
+        low (float, optional): Lowest valid pixel value. Defaults to 200.
+        high (float, optional): Highest valid pixel value. Defaults to 400.
+        nodata (float, optional): No-data value of the raster, see get_invalid_mask. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Boolean array of pixels that need a fitted base temperature.
+    """
+    with stage('find_missing_pixels'):
+        input_dataset = gdal.Open(input_file_path)
+        input_array = input_dataset.GetRasterBand(1).ReadAsArray()
+        return dilate_mask(get_invalid_mask(input_array, low, high, nodata), window_radius)
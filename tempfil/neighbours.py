@@ -0,0 +1,286 @@
+import os
+from collections import namedtuple
+import numpy as np
+from scipy.ndimage import uniform_filter
+from scipy.sparse import csr_matrix
+from .pred_temp import spatial_distance_weights, _gather_windows, fill_missing_centres
+from .base_atc_temp import annual_temperature_cycle, get_acquisition_date
+from .stack import list_stack_files
+from .cache import file_signatures, cache_path, read_manifest, write_manifest, clear_manifest, load_array, create_array, commit_arrays, entry_lock
+from .instrument import stage, count, instrumentation_enabled
+
+# Candidate similar pixels of the gap-prone pixels of a scene, as the rows of a CSR matrix over the flattened image:
+#   lookup     row of each flattened pixel in the index, -1 for pixels not indexed
+#   indptr     start of the candidates of each row in indices and positions
+#   indices    flattened image index of each candidate, window borders reflected as in fill_missing_centres
+#   positions  flattened position of each candidate in the window, giving its spatial term D1
+# The candidates of a row are ranked from the most to the least similar in ATC.
+NeighbourIndex = namedtuple('NeighbourIndex', ['window_radius', 'lookup', 'indptr', 'indices', 'positions'])
+
+# Days of year sharing one index. Similar pixels drift with the season, so each slot keeps the
+# candidates of its own days; across a whole year they would cover most of the window.
+SLOT_DAYS = 16
+
+INDEX_ARRAYS = ['lookup', 'indptr', 'indices', 'positions']
+
+def window_std(array, window_radius):
+    """
+    Computes the standard deviation of the window around every pixel, borders reflected as in fill_missing_centres.
+
+    Args:
+        array (numpy.ndarray): 2D array.
+        window_radius (int): Radius of the moving window.
+
+    Returns:
+        numpy.ndarray: Standard deviation of each window, NaN where the window holds a NaN.
+    """
+    size = 2 * window_radius + 1
+    array = np.asarray(array, dtype=float)
+    missing = np.isnan(array)
+    if np.all(missing):
+        return np.full(array.shape, np.nan)
+    # Moments of the non-NaN values only, so a NaN does not spread past its own windows; centred
+    # first, so the difference of the two moments keeps its precision
+    centred = np.where(missing, 0, array - np.nanmedian(array))
+    mean = uniform_filter(centred, size, mode='mirror')
+    variance = uniform_filter(centred ** 2, size, mode='mirror') - mean ** 2
+    std = np.sqrt(np.maximum(variance, 0))
+    std[uniform_filter(missing.astype(float), size, mode='mirror') > 0.5 / size**2] = np.nan
+    return std
+
+def slot_reference_days(day, slot_days=SLOT_DAYS):
+    """
+    Returns the slot of a day of year and the days whose ATC surfaces select its candidates.
+
+    Args:
+        day (int): Day of year.
+        slot_days (int, optional): Number of days of a slot. Defaults to SLOT_DAYS.
+
+    Returns:
+        tuple: Slot number, and its first, middle and last days.
+    """
+    slot = (day - 1) // slot_days
+    first, last = slot * slot_days + 1, min((slot + 1) * slot_days, 366)
+    return slot, [first, (first + last) // 2, last]
+
+def build_neighbour_rows(params, centres, window_radius, reference_days, slack=1.25, max_candidates=None, chunk_size=4096):
+    """
+    Selects the candidate similar pixels of some centres from the ATC parameter grids.
+
+    A window pixel is a candidate when rec_lst would take it as similar to
+    the centre, with the threshold widened by slack, on any of the reference
+    days. Candidates are ranked by their mean ATC difference to the centre.
+
+    Args:
+        params (numpy.ndarray): ATC parameter grids A, B, C, D with shape (4, rows, cols).
+        centres (numpy.ndarray): (N, 2) array of row/column indices of the pixels to index.
+        window_radius (int): Radius of the moving window.
+        reference_days (list): Days of year of the ATC surfaces, see slot_reference_days.
+        slack (float, optional): Factor widening the similarity threshold. Defaults to 1.25.
+        max_candidates (int, optional): Keep only the best ranked candidates of each centre. Defaults to None (all).
+        chunk_size (int, optional): Number of windows processed per batch. Defaults to 4096.
+
+    Returns:
+        tuple: Number of candidates of each centre, and their flattened image indices and window positions.
+    """
+    _, rows, cols = params.shape
+    size = 2 * window_radius + 1
+    centre = window_radius * size + window_radius
+    pixel_ids = np.arange(rows * cols).reshape(rows, cols)
+    n = min(chunk_size, len(centres))
+    id_buffer = np.empty((n, size * size), dtype=np.int64)
+    param_buffers = np.empty((4, n, size * size))
+    counts, indices, positions = [], [], []
+
+    for start in range(0, len(centres), chunk_size):
+        ci, cj = centres[start:start + chunk_size].T
+        ids = _gather_windows(pixel_ids, ci, cj, window_radius, id_buffer[:len(ci)])
+        w_params = [_gather_windows(grid, ci, cj, window_radius, buffer[:len(ci)]) for grid, buffer in zip(params, param_buffers)]
+
+        similar = np.zeros(ids.shape, dtype=bool)
+        rank = np.zeros(ids.shape)
+        for day in reference_days:
+            w_atc = annual_temperature_cycle(day, *w_params)
+            d2s = np.abs(w_atc[:, centre, None] - w_atc)
+            rs = 2 * np.std(w_atc, axis=1) / 4
+            with np.errstate(invalid='ignore'):
+                similar |= d2s <= slack * rs[:, None]
+            rank += d2s
+
+        order = np.argsort(np.where(similar, rank, np.inf), axis=1, kind='stable')
+        n_similar = np.count_nonzero(similar, axis=1)
+        if max_candidates is not None:
+            n_similar = np.minimum(n_similar, max_candidates)
+        keep = np.arange(size * size) < n_similar[:, None]
+        counts.append(n_similar)
+        indices.append(np.take_along_axis(ids, order, axis=1)[keep])
+        positions.append(order[keep].astype(np.int32))
+
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    return np.concatenate(counts), np.concatenate(indices), np.concatenate(positions)
+
+def build_neighbour_index(params, window_radius, reference_days, mask=None, **options):
+    """
+    Builds an in-memory neighbour index of the masked pixels, see build_neighbour_rows.
+
+    Args:
+        params (numpy.ndarray): ATC parameter grids A, B, C, D with shape (4, rows, cols).
+        window_radius (int): Radius of the moving window.
+        reference_days (list): Days of year of the ATC surfaces, see slot_reference_days.
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of the pixels to index. Defaults to all pixels.
+        **options: slack, max_candidates and chunk_size of build_neighbour_rows.
+
+    Returns:
+        NeighbourIndex: Index of the masked pixels.
+    """
+    _, rows, cols = params.shape
+    if mask is None:
+        mask = np.ones((rows, cols), dtype=bool)
+    with stage('neighbour_index'):
+        counts, indices, positions = build_neighbour_rows(params, np.argwhere(mask), window_radius, reference_days, **options)
+    lookup = np.full(rows * cols, -1, dtype=np.int64)
+    lookup[np.flatnonzero(mask)] = np.arange(len(counts))
+    indptr = np.concatenate(([0], np.cumsum(counts)))
+    return NeighbourIndex(window_radius, lookup, indptr, indices, positions)
+
+def get_neighbour_index(folder_path, cache_dir, params, window_radius, mask, day, valid_range=(265, 320),
+                        parse_key=get_acquisition_date, slot_days=SLOT_DAYS, slack=1.25, max_candidates=None):
+    """
+    Returns the neighbour index of a stack for the slot of a day from an on-disk cache, adding the masked pixels it lacks.
+
+    Every date of the slot reuses the same index. It grows with the gaps of
+    the scenes reconstructed, so it ends up covering the gap-prone pixels,
+    and is rebuilt when scenes of the stack are added, removed or modified,
+    as the ATC parameters then change.
+
+    Args:
+        folder_path (str): Path to the folder containing Landsat files.
+        cache_dir (str): Root directory of the cache.
+        params (numpy.ndarray): ATC parameter grids of the stack with shape (4, rows, cols), see get_atc_parameters.
+        window_radius (int): Radius of the moving window.
+        mask (numpy.ndarray): Boolean (rows, cols) array of the pixels to fill.
+        day (int): Day of year of the target date.
+        valid_range (tuple, optional): Inclusive range of valid pixel values of the ATC fit. Defaults to (265, 320).
+        parse_key (callable, optional): Function mapping a file name to its acquisition date,
+            see sensor.get_parse_key. Defaults to get_acquisition_date.
+        slot_days (int, optional): Number of days sharing one index. Defaults to SLOT_DAYS.
+        slack (float, optional): Factor widening the similarity threshold. Defaults to 1.25.
+        max_candidates (int, optional): Keep only the best ranked candidates of each pixel. Defaults to None (all).
+
+    Returns:
+        NeighbourIndex: Memory-mapped index covering at least the masked pixels.
+    """
+    entries = list_stack_files(folder_path, parse_key)
+    signatures = file_signatures([file_path for _, file_path in entries])
+    _, rows, cols = params.shape
+    slot, reference_days = slot_reference_days(day, slot_days)
+    settings = {'valid_range': list(valid_range), 'window_radius': window_radius, 'slot_days': slot_days, 'slot': slot,
+                'slack': slack, 'max_candidates': max_candidates}
+    path = cache_path(cache_dir, folder_path, 'neighbours', settings)
+    with entry_lock(path):
+        manifest = read_manifest(path)
+        if manifest is not None and sorted(manifest['signatures']) == sorted(signatures):
+            lookup, indptr, indices, positions = (load_array(path, name) for name in INDEX_ARRAYS)
+        else:
+            lookup = np.full(rows * cols, -1, dtype=np.int64)
+            indptr, indices, positions = np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+
+        new = np.flatnonzero(mask.ravel() & (lookup < 0))
+        if len(new) == 0:
+            return NeighbourIndex(window_radius, lookup, indptr, indices, positions)
+
+        with stage('neighbour_index'):
+            counts, new_indices, new_positions = build_neighbour_rows(params, np.stack(np.divmod(new, cols), axis=1), window_radius,
+                                                                      reference_days, slack, max_candidates)
+            n_rows, n_entries = len(indptr) - 1, len(indices)
+            clear_manifest(path)
+            arrays = {'lookup': create_array(path, 'lookup', lookup.shape, dtype=np.int64),
+                      'indptr': create_array(path, 'indptr', (n_rows + len(new) + 1,), dtype=np.int64),
+                      'indices': create_array(path, 'indices', (n_entries + len(new_indices),), dtype=np.int64),
+                      'positions': create_array(path, 'positions', (n_entries + len(new_positions),), dtype=np.int32)}
+            arrays['lookup'][...] = lookup
+            arrays['lookup'][new] = n_rows + np.arange(len(new))
+            arrays['indptr'][:n_rows + 1] = indptr
+            arrays['indptr'][n_rows + 1:] = n_entries + np.cumsum(counts)
+            arrays['indices'][:n_entries], arrays['indices'][n_entries:] = indices, new_indices
+            arrays['positions'][:n_entries], arrays['positions'][n_entries:] = positions, new_positions
+            for array in arrays.values():
+                array.flush()
+            del arrays, lookup, indptr, indices, positions
+            commit_arrays(path, INDEX_ARRAYS)
+        write_manifest(path, {'folder_path': os.path.abspath(folder_path), **settings, 'signatures': signatures})
+        if instrumentation_enabled():
+            count('neighbour_rows_built', len(new))
+        return NeighbourIndex(window_radius, *(load_array(path, name) for name in INDEX_ARRAYS))
+
+def fill_from_neighbour_index(ts, atc, centres, index, valid=None, chunk_size=4096):
+    """
+    Estimates missing pixel values as sparse weighted gathers over their indexed candidates.
+
+    The rule of rec_lst is applied to the candidates with the given ATC
+    surface: the similarity threshold and the ATC distances D2 are those of
+    the date, only the search over the window is replaced by the index. The
+    result equals fill_missing_centres whenever the candidates hold every
+    pixel similar on that date, which the slack of the index ensures for
+    the dates of its slot but for rare pixels. Centres missing from the
+    index are filled by fill_missing_centres.
+
+    Args:
+        ts (numpy.ndarray): 2D array of pixel values.
+        atc (numpy.ndarray): 2D array of the Annual Temperature Cycle, same shape as ts.
+        centres (numpy.ndarray): (N, 2) array of row/column indices of missing pixels.
+        index (NeighbourIndex): Index of the candidates, see get_neighbour_index.
+        valid (numpy.ndarray, optional): Boolean array of the pixels of ts that may be used. Defaults to the non-NaN pixels.
+        chunk_size (int, optional): Number of centres processed per batch. Defaults to 4096.
+
+    Returns:
+        numpy.ndarray: Estimated values of the N missing pixels.
+    """
+    rows, cols = ts.shape
+    window_radius = index.window_radius
+    if valid is None:
+        valid = ~np.isnan(ts)
+    flat = centres[:, 0] * cols + centres[:, 1]
+    index_rows = np.asarray(index.lookup[flat])
+    estimates = np.empty(len(centres))
+    unindexed = index_rows < 0
+    if np.any(unindexed):
+        estimates[unindexed] = fill_missing_centres(ts, atc, centres[unindexed], window_radius, chunk_size, valid)
+        if instrumentation_enabled():
+            count('pixels_not_indexed', np.count_nonzero(unindexed))
+
+    with stage('m_window'):
+        atc_flat = np.asarray(atc, dtype=float).ravel()
+        valid_flat = valid.ravel()
+        rs = 2 * window_std(atc, window_radius).ravel() / 4
+        # Residuals of the usable pixels, zero elsewhere so they drop out of the products
+        with np.errstate(invalid='ignore'):
+            residuals = np.where(valid_flat & np.isfinite(atc_flat), ts.ravel() - atc_flat, 0)
+        d1s = spatial_distance_weights(window_radius).ravel()
+
+        indexed = np.flatnonzero(~unindexed)
+        for start in range(0, len(indexed), chunk_size):
+            chunk = indexed[start:start + chunk_size]
+            starts = np.asarray(index.indptr[index_rows[chunk]])
+            lengths = np.asarray(index.indptr[index_rows[chunk] + 1]) - starts
+            indptr = np.concatenate(([0], np.cumsum(lengths)))
+            owners = np.repeat(np.arange(len(chunk)), lengths)
+            entries = np.arange(indptr[-1]) - indptr[owners] + starts[owners]
+            candidates, positions = np.asarray(index.indices[entries]), np.asarray(index.positions[entries])
+
+            atc_centre = atc_flat[flat[chunk]]
+            d2s = np.abs(atc_centre[owners] - atc_flat[candidates])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                similar = (d2s <= rs[flat[chunk]][owners]) & valid_flat[candidates]
+                ws = np.where(similar & (d2s != 0), 1 / (d1s[positions] * np.log(1 + d2s)), 0)
+                weights = csr_matrix((ws, candidates, indptr), shape=(len(chunk), rows * cols))
+                weight_sum = np.bincount(owners, ws, minlength=len(chunk))
+                correction = weights @ residuals / weight_sum
+            estimates[chunk] = np.where(weight_sum != 0, atc_centre + correction, atc_centre)
+
+    if instrumentation_enabled():
+        left_nan = np.count_nonzero(np.isnan(estimates[~unindexed]))
+        count('pixels_filled', len(indexed) - left_nan)
+        count('pixels_left_nan', left_nan)
+    return estimates
@@ -1,9 +1,7 @@
 import numpy as np
-from scipy.optimize import curve_fit
-from datetime import datetime
-import os
-from osgeo import gdal
-import pandas as pd
+from osgeo import gdal, osr
+from numpy.lib.stride_tricks import sliding_window_view
+from .instrument import stage, count, instrumentation_enabled
 
 def rec_lst(ts, atc):
     """
@@ -53,10 +51,108 @@ def rec_lst(ts, atc):
         rts = ts[cp_x, cp_y]
     return rts
 
+def spatial_distance_weights(window_radius):
+    """
+    Computes the spatial-distance term D1 of rec_lst for every offset of the window.
+
+    Args:
+        window_radius (int): Radius of the moving window.
+
+    Returns:
+        numpy.ndarray: (2 * window_radius + 1) square array of D1 values.
+    """
+    size = 2 * window_radius + 1
+    r, c = np.indices((size, size))
+    return 1 + 2 * (np.sqrt((r - size)**2 + (c - size)**2)) / 4
+
+def _reflect_index(index, size):
+    # Index into an axis of the given size, mirrored at its ends like np.pad(..., 'reflect')
+    if size == 1:
+        return np.zeros_like(index)
+    period = 2 * (size - 1)
+    index = np.abs(index) % period
+    return np.where(index >= size, period - index, index)
+
+def _gather_windows(array, ci, cj, window_radius, out):
+    # Copies the flattened windows around the centres into out: interior windows from a
+    # strided view of the array, the few crossing its edges through reflected indices
+    rows, cols = array.shape
+    r = window_radius
+    size = 2 * r + 1
+    inside = (ci >= r) & (ci < rows - r) & (cj >= r) & (cj < cols - r)
+    if np.any(inside):
+        windows = sliding_window_view(array, (size, size))
+        out[inside] = windows[ci[inside] - r, cj[inside] - r].reshape(-1, size * size)
+    if not np.all(inside):
+        offsets = np.arange(-r, r + 1)
+        wi = _reflect_index(ci[~inside, None] + offsets, rows)[:, :, None]
+        wj = _reflect_index(cj[~inside, None] + offsets, cols)[:, None, :]
+        out[~inside] = array[wi, wj].reshape(-1, size * size)
+    return out
+
+def fill_missing_centres(ts, atc, centres, window_radius, chunk_size=4096, valid=None):
+    """
+    Estimates missing pixel values in batches, numerically matching rec_lst.
+
+    Windows running past the edges of the arrays are reflected inside the
+    kernel, as np.pad(..., 'reflect') would, so no padded copies are made.
+    Windows are gathered chunk by chunk into float64 buffers reused by
+    every chunk.
+
+    Args:
+        ts (numpy.ndarray): 2D array of pixel values.
+        atc (numpy.ndarray): 2D array of the Annual Temperature Cycle, same shape as ts.
+        centres (numpy.ndarray): (N, 2) array of row/column indices of missing pixels.
+        window_radius (int): Radius of the moving window.
+        chunk_size (int, optional): Number of windows processed per batch. Defaults to 4096.
+        valid (numpy.ndarray, optional): Boolean array of the pixels of ts that may be used. Defaults to the non-NaN pixels.
+
+    Returns:
+        numpy.ndarray: Estimated values of the N missing pixels.
+    """
+    size = 2 * window_radius + 1
+    centre = window_radius * size + window_radius
+    d1s = spatial_distance_weights(window_radius).ravel()
+    if valid is None:
+        valid = ~np.isnan(ts)
+    estimates = np.empty(len(centres))
+    n = min(chunk_size, len(centres))
+    ts_buffer, atc_buffer = np.empty((n, size * size)), np.empty((n, size * size))
+    valid_buffer = np.empty((n, size * size), dtype=bool)
+
+    with stage('m_window'):
+        for start in range(0, len(centres), chunk_size):
+            ci, cj = centres[start:start + chunk_size].T
+            w_ts = _gather_windows(ts, ci, cj, window_radius, ts_buffer[:len(ci)])
+            w_atc = _gather_windows(atc, ci, cj, window_radius, atc_buffer[:len(ci)])
+            w_valid = _gather_windows(valid, ci, cj, window_radius, valid_buffer[:len(ci)])
+            atc_centre = w_atc[:, centre]
+
+            # Similar pixels: close in ATC and not missing themselves
+            d2s = np.abs(atc_centre[:, None] - w_atc)
+            rs = 2 * np.std(w_atc, axis=1) / 4
+            with np.errstate(invalid='ignore', divide='ignore'):
+                similar = (d2s <= rs[:, None]) & w_valid
+                ws = np.where(similar & (d2s != 0), 1 / (d1s * np.log(1 + d2s)), 0)
+                weight_sum = np.sum(ws, axis=1)
+
+                # Log-weighted residual correction of the central ATC value
+                residuals = np.where(similar, w_ts - w_atc, 0)
+                correction = np.sum(ws / weight_sum[:, None] * residuals, axis=1)
+            estimates[start:start + len(ci)] = np.where(weight_sum != 0, atc_centre + correction, atc_centre)
+
+    if instrumentation_enabled():
+        left_nan = np.count_nonzero(np.isnan(estimates))
+        count('pixels_filled', len(estimates) - left_nan)
+        count('pixels_left_nan', left_nan)
+    return estimates
+
 def m_window(ts, atc, window_radius, stride=1):
     """
     Applies a moving window to estimate missing pixel values.
 
+    Only the missing (NaN) centres are visited; valid pixels keep their value.
+
     Args:
         ts (numpy.ndarray): Input 2D array representing pixel values.
         atc (numpy.ndarray): Input 2D array representing Annual Temperature Cycle.
@@ -66,21 +162,90 @@ def m_window(ts, atc, window_radius, stride=1):
     Returns:
         numpy.ndarray: Array with estimated pixel values.
     """
-    padimage_1 = np.pad(ts, window_radius, 'reflect')
-    padimage_2 = np.pad(atc, window_radius, 'reflect')
-    output = np.zeros_like(ts)
-
-    for i in range(ts.shape[0]):
-        for j in range(ts.shape[1]):
-            indx_i = i + window_radius
-            indx_j = j + window_radius
-            if indx_i + window_radius + 1 <= padimage_1.shape[0] and indx_j + window_radius + 1 <= padimage_1.shape[1]:
-                output[i, j] = rec_lst(padimage_1[indx_i - window_radius:indx_i + window_radius + 1, indx_j - window_radius:indx_j + window_radius + 1],
-                                   padimage_2[indx_i - window_radius:indx_i + window_radius + 1, indx_j - window_radius:indx_j + window_radius + 1])
+    output = np.array(ts, copy=True)
+    valid = ~np.isnan(ts)
+
+    # Borders are reflected inside fill_missing_centres, without padded copies of the images
+    centres = np.argwhere(~valid)
+    output[centres[:, 0], centres[:, 1]] = fill_missing_centres(ts, atc, centres, window_radius, valid=valid)
 
     return output
 
-def create_georeferenced_tif(reference_tif, array_2d, output_path):
+def open_georeferenced_tif(reference_tif, output_path, bands=1, data_type=gdal.GDT_Float32, nodata=None,
+                           tiled=True, block_size=256, compress='DEFLATE', predictor=None, bigtiff='IF_SAFER', crs=None,
+                           interleave=None, descriptions=None):
+    """
+    Creates an empty GeoTIFF with the grid and projection of a reference raster, ready for block writes.
+
+    Args:
+        reference_tif (str): Path to a reference TIFF file.
+        output_path (str): Output path for the new TIFF file.
+        bands (int, optional): Number of bands. Defaults to 1.
+        data_type (int, optional): GDAL data type of the bands. Defaults to gdal.GDT_Float32.
+        nodata (float, optional): No-data value of the bands. Defaults to None (not set).
+        tiled (bool, optional): Whether to write a tiled GeoTIFF. Defaults to True.
+        block_size (int, optional): Tile width and height. Defaults to 256.
+        compress (str, optional): GTiff compression (e.g. 'DEFLATE', 'LZW', 'ZSTD'), or None. Defaults to 'DEFLATE'.
+        predictor (int, optional): GTiff predictor; defaults to 3 for floating point and 2 for integer data.
+        bigtiff (str, optional): GTiff BIGTIFF option ('YES', 'NO', 'IF_NEEDED', 'IF_SAFER'). Defaults to 'IF_SAFER'.
+        crs (str, optional): CRS assigned to the output (e.g. 'EPSG:32649'), without reprojecting.
+            Defaults to None (projection of the reference).
+        interleave (str, optional): GTiff INTERLEAVE of multiband outputs ('BAND' or 'PIXEL'). Defaults to None
+            (GDAL default).
+        descriptions (list, optional): Description of each band, e.g. its date. Defaults to None.
+
+    Returns:
+        gdal.Dataset: Output dataset open for writing.
+    """
+    ref = gdal.Open(reference_tif)
+    options = [f'BIGTIFF={bigtiff}']
+    if interleave:
+        options.append(f'INTERLEAVE={interleave}')
+    if tiled:
+        options += ['TILED=YES', f'BLOCKXSIZE={block_size}', f'BLOCKYSIZE={block_size}']
+    if compress:
+        if predictor is None:
+            predictor = 3 if data_type in (gdal.GDT_Float32, gdal.GDT_Float64) else 2
+        options += [f'COMPRESS={compress}', f'PREDICTOR={predictor}']
+
+    driver = gdal.GetDriverByName('GTiff')
+    output_tif = driver.Create(output_path, ref.RasterXSize, ref.RasterYSize, bands, data_type, options)
+    output_tif.SetGeoTransform(ref.GetGeoTransform())
+    if crs is None:
+        output_tif.SetProjection(ref.GetProjection())
+    else:
+        srs = osr.SpatialReference()
+        srs.SetFromUserInput(crs)
+        output_tif.SetProjection(srs.ExportToWkt())
+    if nodata is not None:
+        for band in range(1, bands + 1):
+            output_tif.GetRasterBand(band).SetNoDataValue(nodata)
+    for band, description in enumerate(descriptions or [], 1):
+        output_tif.GetRasterBand(band).SetDescription(description)
+    ref = None
+    return output_tif
+
+def write_block(output_tif, block, xoff=0, yoff=0, band=1):
+    """
+    Writes a block of pixel values into an open GeoTIFF.
+
+    Pixels left NaN are written as the no-data value of the band, if it has one.
+
+    Args:
+        output_tif (gdal.Dataset): Dataset returned by open_georeferenced_tif.
+        block (numpy.ndarray): 2D array of pixel values.
+        xoff (int, optional): Column offset of the block. Defaults to 0.
+        yoff (int, optional): Row offset of the block. Defaults to 0.
+        band (int, optional): Band number. Defaults to 1.
+    """
+    with stage('write'):
+        output_band = output_tif.GetRasterBand(band)
+        nodata = output_band.GetNoDataValue()
+        if nodata is not None and np.isnan(block).any():
+            block = np.where(np.isnan(block), nodata, block)
+        output_band.WriteArray(block, xoff, yoff)
+
+def create_georeferenced_tif(reference_tif, array_2d, output_path, **options):
     """
     Creates a georeferenced TIFF file from a 2D array.
 
@@ -88,26 +253,12 @@ def create_georeferenced_tif(reference_tif, array_2d, output_path):
         reference_tif (str): Path to a reference TIFF file.
         array_2d (numpy.ndarray): 2D array representing pixel values.
         output_path (str): Output path for the new TIFF file.
+        **options: Creation options passed to open_georeferenced_tif.
 
     Returns:
         gdal.Dataset: Output georeferenced TIFF file.
     """
-    ds = gdal.Open(reference_tif)
-    gt = ds.GetGeoTransform()
-    res = gt[1]
-    xmin = gt[0]
-    ymax = gt[3]
-    xsize = ds.RasterXSize
-    ysize = ds.RasterYSize
-    xstart = xmin + res/2
-    ystart = ymax - res/2
-    x = np.arange(xstart, xstart+xsize*res, res)
-    y = np.arange(ystart, ystart-ysize*res, -res)
-    x = np.tile(x, ysize)
-    y = np.repeat(y, xsize)
-    flatee = array_2d.flatten()
-    dfn1 = pd.DataFrame({"x": x, "y": y, "value": flatee})
-    dfn1.to_csv(r"data\array_2d.xyz", index=False, header=None, sep=" ")
-    output_tif = gdal.Translate(output_path, r"data\array_2d.xyz", outputSRS="EPSG:32649")
-    ds = None
-    return output_tif
\ No newline at end of file
+    output_tif = open_georeferenced_tif(reference_tif, output_path, **options)
+    write_block(output_tif, array_2d)
+    output_tif.FlushCache()
+    return output_tif
@@ -0,0 +1,71 @@
+from collections import namedtuple
+import numpy as np
+
+# Fallback level reached by the fit of a pixel
+FIT_NONE, FIT_FULL, FIT_REDUCED, FIT_NEIGHBOURS = 0, 1, 2, 3
+
+# Per-pixel quality of a fit: level (FIT_*), number of valid observations and standard error of each parameter
+FitQuality = namedtuple('FitQuality', ['level', 'n_obs', 'std_error'])
+
+def empty_quality(n_params, shape):
+    """
+    Creates quality grids for pixels that are not fitted yet.
+
+    Args:
+        n_params (int): Number of model parameters.
+        shape (tuple): (rows, cols) of the grids.
+
+    Returns:
+        FitQuality: Level FIT_NONE, zero observations and NaN standard errors.
+    """
+    return FitQuality(np.full(shape, FIT_NONE, dtype=np.int8), np.zeros(shape, dtype=np.int32),
+                      np.full((n_params,) + tuple(shape), np.nan))
+
+def fill_from_neighbours(params, level, mask=None, radius=2):
+    """
+    Gives unfitted pixels the mean parameters of the fitted pixels around them.
+
+    Last step of the fallback chain: pixels left at FIT_NONE with at least
+    one fitted pixel within the radius take their neighbours' mean and move
+    to FIT_NEIGHBOURS. The others stay NaN.
+
+    Args:
+        params (numpy.ndarray): Parameter grids with shape (n_params, rows, cols), updated in place.
+        level (numpy.ndarray): Fallback level grid with shape (rows, cols), updated in place.
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to fill. Defaults to all pixels.
+        radius (int, optional): Radius of the square neighbourhood. Defaults to 2.
+
+    Returns:
+        tuple: Boolean (rows, cols) array of the filled pixels, and the spread (standard deviation)
+            of the neighbours' parameters with shape (n_params, rows, cols), NaN elsewhere.
+    """
+    fitted = (level == FIT_FULL) | (level == FIT_REDUCED)
+    target = level == FIT_NONE
+    if mask is not None:
+        target &= mask
+    spread = np.full(params.shape, np.nan)
+    if radius <= 0 or not np.any(target) or not np.any(fitted):
+        return np.zeros(level.shape, dtype=bool), spread
+
+    # Summing the window of every target pixel in a fixed order, unlike a running filter, so a
+    # pixel gets the same mean whatever the extent of the grids around it
+    rows, cols = np.nonzero(target)
+    padded_fitted = np.pad(fitted, radius)
+    padded_values = np.pad(np.where(fitted, params, 0), ((0, 0), (radius, radius), (radius, radius)))
+    n_fitted = np.zeros(len(rows))
+    sums, square_sums = np.zeros((len(params), len(rows))), np.zeros((len(params), len(rows)))
+    for dr in range(2 * radius + 1):
+        for dc in range(2 * radius + 1):
+            window_values = padded_values[:, rows + dr, cols + dc]
+            n_fitted += padded_fitted[rows + dr, cols + dc]
+            sums += window_values
+            square_sums += window_values**2
+    found = n_fitted > 0
+    rows, cols, n_fitted = rows[found], cols[found], n_fitted[found]
+    mean, mean_square = sums[:, found] / n_fitted, square_sums[:, found] / n_fitted
+    filled = np.zeros(level.shape, dtype=bool)
+    filled[rows, cols] = True
+    params[:, rows, cols] = mean
+    spread[:, rows, cols] = np.sqrt(np.maximum(mean_square - mean**2, 0))
+    level[filled] = FIT_NEIGHBOURS
+    return filled, spread
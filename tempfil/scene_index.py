@@ -0,0 +1,153 @@
+import os
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from osgeo import gdal
+from .stack import LstStack, list_stack_files, read_stack
+from .cache import file_signatures, cache_path, read_manifest, write_manifest
+from .instrument import stage
+from .utility import LST_DTYPE
+
+# One scene of a stack: acquisition date, path and fraction of its pixels in the valid range
+SceneInfo = namedtuple('SceneInfo', ['key', 'file_path', 'valid_fraction'])
+
+def scene_valid_fraction(file_path, valid_range=(265, 320), sample_size=512):
+    """
+    Estimates the fraction of valid pixels of a scene from a subsampled read.
+
+    Args:
+        file_path (str): Path to the LST file.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        sample_size (int, optional): Largest height and width of the subsampled read. Defaults to 512.
+
+    Returns:
+        float: Fraction of valid pixels.
+    """
+    dataset = gdal.Open(file_path)
+    rows, cols = dataset.RasterYSize, dataset.RasterXSize
+    sample = dataset.GetRasterBand(1).ReadAsArray(buf_xsize=min(cols, sample_size), buf_ysize=min(rows, sample_size))
+    with np.errstate(invalid='ignore'):
+        return float(np.mean((sample >= valid_range[0]) & (sample <= valid_range[1])))
+
+def build_scene_index(folder_path, parse_key, valid_range=(265, 320), cache_dir=None):
+    """
+    Lists the scenes of a folder with their acquisition date and valid-pixel fraction.
+
+    With a cache directory the index is kept on disk and only new or
+    modified scenes are read again.
+
+    Args:
+        folder_path (str): Path to the folder containing LST files.
+        parse_key (callable): Function mapping a file name to its acquisition date.
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        cache_dir (str, optional): Root directory of the cache. Defaults to None (index not stored).
+
+    Returns:
+        list: SceneInfo of every scene, sorted by acquisition date.
+    """
+    entries = list_stack_files(folder_path, parse_key)
+    if not entries:
+        raise FileNotFoundError(f"No .tif files found in {folder_path}")
+    signatures = file_signatures([file_path for _, file_path in entries])
+
+    path, known = None, {}
+    if cache_dir is not None:
+        path = cache_path(cache_dir, folder_path, 'scenes', {'valid_range': list(valid_range)})
+        manifest = read_manifest(path)
+        if manifest is not None:
+            known = {tuple(signature): fraction for signature, fraction in manifest['scenes']}
+
+    index, fractions = [], []
+    for (key, file_path), signature in zip(entries, signatures):
+        fraction = known.get(tuple(signature))
+        if fraction is None:
+            fraction = scene_valid_fraction(file_path, valid_range)
+        index.append(SceneInfo(key, file_path, fraction))
+        fractions.append([signature, fraction])
+
+    if path is not None and len(known) != len(fractions):
+        write_manifest(path, {'folder_path': os.path.abspath(folder_path), 'scenes': fractions})
+    return index
+
+def select_scenes(index, date, nearest_years=None, seasonal_window=None, min_valid_fraction=0.0):
+    """
+    Selects the scenes used to fit a target date, closest first.
+
+    Scenes without valid pixels are always left out. Closeness is the
+    day-of-year distance to the target date, then the distance in years.
+
+    Args:
+        index (list): SceneInfo of every scene, see build_scene_index.
+        date (str): Target date (format: YYYY-MM-DD).
+        nearest_years (int, optional): Keep the scenes of the K years closest to the target year. Defaults to None (all years).
+        seasonal_window (int, optional): Keep scenes within this many days of the target day of year,
+            in any year. Defaults to None (whole year).
+        min_valid_fraction (float, optional): Leave out scenes with fewer valid pixels. Defaults to 0.
+
+    Returns:
+        list: Selected SceneInfo, closest to the target date first.
+    """
+    target = datetime.strptime(date, '%Y-%m-%d').date()
+    target_doy = target.timetuple().tm_yday
+
+    def seasonal_distance(scene):
+        distance = abs(scene.key.timetuple().tm_yday - target_doy)
+        return min(distance, 365 - distance)
+
+    scenes = [scene for scene in index if scene.valid_fraction > 0 and scene.valid_fraction >= min_valid_fraction]
+    if seasonal_window is not None:
+        scenes = [scene for scene in scenes if seasonal_distance(scene) <= seasonal_window]
+    if nearest_years is not None:
+        years = sorted({scene.key.year for scene in scenes}, key=lambda year: (abs(year - target.year), year))
+        kept = set(years[:nearest_years])
+        scenes = [scene for scene in scenes if scene.key.year in kept]
+
+    scenes.sort(key=lambda scene: (seasonal_distance(scene), abs(scene.key.year - target.year), scene.key))
+    return scenes
+
+def read_selected_scenes(scenes, mask=None, min_observations=None, valid_range=(265, 320), keep_cube=True):
+    """
+    Reads selected scenes closest first, stopping once every masked pixel has enough valid observations.
+
+    Args:
+        scenes (list): SceneInfo to read, closest first, see select_scenes.
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to be fitted. Defaults to all pixels.
+        min_observations (int, optional): Valid observations wanted per masked pixel. Defaults to None (read every scene).
+        valid_range (tuple, optional): Inclusive range of valid pixel values. Defaults to (265, 320).
+        keep_cube (bool, optional): Whether to return the pixel values, or only the chosen scenes. Defaults to True.
+
+    Returns:
+        LstStack: Stack of the scenes read, in time order; its cube is None if keep_cube is False.
+    """
+    if not scenes:
+        raise ValueError("No scenes are left after the scene selection")
+    if min_observations is None:
+        chosen = sorted(scenes)
+        file_paths = [scene.file_path for scene in chosen]
+        return LstStack(read_stack(file_paths) if keep_cube else None, [scene.key for scene in chosen], file_paths)
+
+    bands, chosen, counts = [], [], None
+    with stage('stack_load'):
+        for scene in scenes:
+            band = gdal.Open(scene.file_path).GetRasterBand(1).ReadAsArray()
+            if mask is None:
+                mask = np.ones(band.shape, dtype=bool)
+            if counts is None:
+                counts = np.zeros(int(mask.sum()), dtype=np.int32)
+            if band.shape != mask.shape:
+                raise ValueError(f"{scene.file_path} has shape {band.shape}, expected {mask.shape}")
+            with np.errstate(invalid='ignore'):
+                counts += (band[mask] >= valid_range[0]) & (band[mask] <= valid_range[1])
+            chosen.append(scene)
+            if keep_cube:
+                bands.append(band)
+            if np.all(counts >= min_observations):
+                break
+
+    order = sorted(range(len(chosen)), key=lambda t: chosen[t].key)
+    cube = None
+    if keep_cube:
+        cube = np.empty(bands[0].shape + (len(order),), dtype=LST_DTYPE)
+        for i, t in enumerate(order):
+            cube[:, :, i] = bands[t]
+    return LstStack(cube, [chosen[t].key for t in order], [chosen[t].file_path for t in order])
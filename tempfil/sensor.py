@@ -0,0 +1,112 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+# Sensor and region settings shared by every stage of a run:
+#   file_pattern  regex finding the acquisition date in a file name, with a 'date' (YYYYMMDD) group,
+#                 or 'year' and 'doy' groups, and an optional 'time' (HHMM, UTC) group
+#   valid_range   inclusive range of pixel values used to fit the temperature cycle models
+#   image_range   inclusive range of valid pixel values of the image to reconstruct
+#   nodata        no-data value of the products, never valid and written to the outputs in place of unfilled pixels
+#   time_zone     local time zone, as hours from UTC or an IANA name such as 'Asia/Hong_Kong'
+#   crs           CRS of the outputs (e.g. 'EPSG:32649'), None to take it from the source image
+SensorProfile = namedtuple('SensorProfile', ['name', 'file_pattern', 'valid_range', 'image_range', 'nodata', 'time_zone', 'crs'],
+                           defaults=((265, 320), (200, 400), None, 0, None))
+
+# Landsat 4-9 LST named like the USGS products (LC08_L1TP_PPPRRR_YYYYMMDD_...), possibly behind a prefix (Clip_LC08_...),
+# with the no-data value of the clipped LST in data/ (999)
+LANDSAT = SensorProfile('landsat', r'(?:^|_)L[COTE]0[4-9]_\w{4}_\d{6}_(?P<date>\d{8})_', (265, 320), (200, 400), 999.0)
+# Hourly Himawari LST named <prefix>YYYYMMDD_HHMM.tif in UTC, over Hong Kong (UTC+8),
+# with the no-data value of the crops in data/ (-3.4028230607370965e+38)
+HIMAWARI = SensorProfile('himawari', r'(?P<date>\d{8})_(?P<time>\d{4})', (260, float('inf')), (200, 400), -3.4028230607370965e+38, 8)
+# MOD11/MYD11 LST already scaled to kelvin (raw values x 0.02), named like the NASA products (.AYYYYDDD.),
+# with the fill value 0 of the MOD11 user guide
+MODIS = SensorProfile('modis', r'\.A(?P<year>\d{4})(?P<doy>\d{3})\.', (265, 320), (200, 400), 0.0)
+
+# Date of the original Landsat parser: the fourth '_'-separated field, e.g. renamed Clip_LC08_PPPRRR_YYYYMMDD_... files
+POSITIONAL_DATE_PATTERN = r'^(?:[^_]*_){3}(?P<date>\d{8})(?=_|\.|$)'
+
+SENSOR_PROFILES = {'landsat': LANDSAT, 'landsat5': LANDSAT, 'landsat7': LANDSAT, 'landsat8': LANDSAT, 'landsat9': LANDSAT, 'himawari': HIMAWARI, 'modis': MODIS}
+
+def get_sensor_profile(sensor):
+    """
+    Looks up a sensor profile by name, or returns a given profile unchanged.
+
+    Custom sensors and regions are described with SensorProfile(...), or by
+    replacing fields of a built-in profile, e.g. HIMAWARI._replace(time_zone=9).
+
+    Args:
+        sensor (str or SensorProfile): Name of a built-in profile ('landsat', 'landsat5', 'landsat7', 'landsat8',
+            'landsat9', 'himawari', 'modis') or a profile.
+
+    Returns:
+        SensorProfile: Profile of the sensor.
+    """
+    if isinstance(sensor, SensorProfile):
+        return sensor
+    try:
+        return SENSOR_PROFILES[str(sensor).lower()]
+    except KeyError:
+        raise ValueError(f"Unknown sensor '{sensor}'. Supported values are {', '.join(SENSOR_PROFILES)} or a SensorProfile.")
+
+def default_sensor_profile(tempfill_type):
+    return LANDSAT if tempfill_type == 'annual' else HIMAWARI
+
+def _local_zone(time_zone):
+    if isinstance(time_zone, str):
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(time_zone)
+    return timezone(timedelta(hours=time_zone))
+
+def parse_acquisition_datetime(file_name, profile):
+    """
+    Extracts the acquisition date and time of a file name, in the local time of the profile.
+
+    Names the pattern of a date-only profile does not match fall back to the
+    positional date of the original Landsat parser, see POSITIONAL_DATE_PATTERN.
+
+    Args:
+        file_name (str): File name.
+        profile (SensorProfile): Sensor profile.
+
+    Returns:
+        datetime.datetime: Local acquisition date and time (midnight when the name has no time).
+    """
+    match = re.search(profile.file_pattern, file_name)
+    if match is None and '(?P<time>' not in profile.file_pattern:
+        match = re.search(POSITIONAL_DATE_PATTERN, file_name)
+    if match is None:
+        raise ValueError(f"{file_name} does not match the {profile.name} file name pattern {profile.file_pattern}. "
+                         f"Pass the sensor option (sensor=... or --sensor) naming the sensor of the files, "
+                         f"or a SensorProfile whose file_pattern matches them.")
+    groups = match.groupdict()
+    if groups.get('date'):
+        acquisition = datetime.strptime(groups['date'], '%Y%m%d')
+    else:
+        acquisition = datetime(int(groups['year']), 1, 1) + timedelta(days=int(groups['doy']) - 1)
+    if not groups.get('time'):
+        return acquisition
+    acquisition += timedelta(hours=int(groups['time'][:2]), minutes=int(groups['time'][2:]))
+    local = acquisition.replace(tzinfo=timezone.utc).astimezone(_local_zone(profile.time_zone))
+    return local.replace(tzinfo=None)
+
+def parse_acquisition_date(file_name, profile):
+    return parse_acquisition_datetime(file_name, profile).date()
+
+def parse_local_time(file_name, profile):
+    return parse_acquisition_datetime(file_name, profile).strftime('%Y%m%d_%H%M')
+
+def get_parse_key(profile, tempfill_type):
+    """
+    Returns the function giving the stack key of a file name: its date for
+    'annual', its local 'YYYYMMDD_HHMM' time for 'diurnal'.
+
+    Args:
+        profile (SensorProfile): Sensor profile.
+        tempfill_type (str): 'annual' or 'diurnal'.
+
+    Returns:
+        callable: Picklable function of a file name.
+    """
+    return partial(parse_acquisition_date if tempfill_type == 'annual' else parse_local_time, profile=profile)
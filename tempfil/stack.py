@@ -0,0 +1,158 @@
+import os
+from collections import namedtuple
+import numpy as np
+from osgeo import gdal
+from .instrument import stage
+from .utility import LST_DTYPE
+
+# Time-series stack: cube is (rows, cols, T), keys/file_paths follow the time axis
+LstStack = namedtuple('LstStack', ['cube', 'keys', 'file_paths'])
+
+def list_stack_files(folder_path, parse_key):
+    """
+    Lists the .tif files of a folder sorted by acquisition date/time.
+
+    Args:
+        folder_path (str): Path to the folder containing LST files.
+        parse_key (callable): Function mapping a file name to its acquisition date/time.
+
+    Returns:
+        list: List of (key, file_path) tuples sorted by key.
+    """
+    entries = []
+    for file_name in os.listdir(folder_path):
+        if file_name.endswith('.tif'):
+            entries.append((parse_key(file_name), os.path.join(folder_path, file_name)))
+    entries.sort()
+    return entries
+
+def read_stack(file_paths, dtype=LST_DTYPE):
+    """
+    Reads the first band of each file once into a (rows, cols, T) cube.
+
+    Args:
+        file_paths (list): Paths to the LST files, in time order.
+        dtype (numpy.dtype, optional): Data type of the cube. Defaults to LST_DTYPE (float32).
+
+    Returns:
+        numpy.ndarray: Cube of pixel values.
+    """
+    dataset = gdal.Open(file_paths[0])
+    rows = dataset.RasterYSize
+    cols = dataset.RasterXSize
+    cube = np.empty((rows, cols, len(file_paths)), dtype=dtype)
+
+    # Reading each band exactly once
+    with stage('stack_load'):
+        for t, file_path in enumerate(file_paths):
+            dataset = gdal.Open(file_path)
+            band_data = dataset.GetRasterBand(1).ReadAsArray()
+            if band_data.shape != (rows, cols):
+                raise ValueError(f"{file_path} has shape {band_data.shape}, expected {(rows, cols)}")
+            cube[:, :, t] = band_data
+            dataset = None
+
+    return cube
+
+def load_stack(folder_path, parse_key):
+    """
+    Reads every scene of a folder once into an in-memory (rows, cols, T) cube.
+
+    Args:
+        folder_path (str): Path to the folder containing LST files.
+        parse_key (callable): Function mapping a file name to its acquisition date/time.
+
+    Returns:
+        LstStack: Cube of pixel values with the sorted acquisition keys and file paths.
+    """
+    entries = list_stack_files(folder_path, parse_key)
+    if not entries:
+        raise FileNotFoundError(f"No .tif files found in {folder_path}")
+
+    keys = [key for key, _ in entries]
+    file_paths = [file_path for _, file_path in entries]
+    return LstStack(read_stack(file_paths), keys, file_paths)
+
+def raster_shape(file_path):
+    """
+    Reads the size of a raster without reading its pixels.
+
+    Args:
+        file_path (str): Path to the raster file.
+
+    Returns:
+        tuple: (rows, cols) of the raster.
+    """
+    dataset = gdal.Open(file_path)
+    return dataset.RasterYSize, dataset.RasterXSize
+
+def read_window(dataset, window):
+    """
+    Reads a window of the first band of a raster.
+
+    Args:
+        dataset (gdal.Dataset or str): Open raster, or path to the raster file.
+        window (tuple): (row_start, row_stop, col_start, col_stop) of the window.
+
+    Returns:
+        numpy.ndarray: 2D array of pixel values.
+    """
+    if isinstance(dataset, str):
+        dataset = gdal.Open(dataset)
+    r0, r1, c0, c1 = window
+    return dataset.GetRasterBand(1).ReadAsArray(c0, r0, c1 - c0, r1 - r0)
+
+def read_stack_window(datasets, window, out=None):
+    """
+    Reads the same window of every scene into a (rows, cols, T) cube.
+
+    Args:
+        datasets (list): Open rasters or paths of the LST files, in time order.
+        window (tuple): (row_start, row_stop, col_start, col_stop) of the window.
+        out (numpy.ndarray, optional): Preallocated cube to read into. Defaults to None (new LST_DTYPE cube).
+
+    Returns:
+        numpy.ndarray: Cube of pixel values.
+    """
+    r0, r1, c0, c1 = window
+    if out is None:
+        out = np.empty((r1 - r0, c1 - c0, len(datasets)), dtype=LST_DTYPE)
+    with stage('stack_load'):
+        for t, dataset in enumerate(datasets):
+            out[:, :, t] = read_window(dataset, window)
+    return out
+
+def iter_block_windows(file_path, n_bands, memory_budget=256 * 2**20, halo=0):
+    """
+    Splits a raster into windows aligned to its native GDAL block structure.
+
+    Windows are sized so that the stack of n_bands LST_DTYPE bands over the
+    window plus a halo on every side fits in the memory budget.
+
+    Args:
+        file_path (str): Path to a raster of the stack.
+        n_bands (int): Number of bands read per window.
+        memory_budget (int, optional): Bytes allowed for one stack window. Defaults to 256 MiB.
+        halo (int, optional): Pixels read around each window. Defaults to 0.
+
+    Returns:
+        generator: (row_start, row_stop, col_start, col_stop) of each window.
+    """
+    dataset = gdal.Open(file_path)
+    rows, cols = dataset.RasterYSize, dataset.RasterXSize
+    block_cols, block_rows = dataset.GetRasterBand(1).GetBlockSize()
+    pixels = max(memory_budget // (np.dtype(LST_DTYPE).itemsize * max(n_bands, 1)), 1)
+
+    if block_cols >= cols:
+        # Stripped raster: full-width windows of whole strips
+        window_cols = cols
+        window_rows = max(pixels // (cols + 2 * halo) - 2 * halo, 1)
+    else:
+        # Tiled raster: square-ish windows of whole tiles
+        window_cols = window_rows = max(int(np.sqrt(pixels)) - 2 * halo, 1)
+        window_cols = max(window_cols // block_cols, 1) * block_cols
+    window_rows = max(window_rows // block_rows, 1) * block_rows
+
+    for r0 in range(0, rows, window_rows):
+        for c0 in range(0, cols, window_cols):
+            yield r0, min(r0 + window_rows, rows), c0, min(c0 + window_cols, cols)
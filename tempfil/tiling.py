@@ -0,0 +1,237 @@
+import numpy as np
+from osgeo import gdal
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from .mask import get_invalid_mask, dilate_mask
+from .pred_temp import fill_missing_centres
+from .stack import raster_shape, read_window, read_stack_window, iter_block_windows
+from .utility import LST_DTYPE, as_float_array
+from .instrument import stage, instrumentation_enabled, enable_instrumentation, take_counters, merge_counters
+
+# Arrays shared with the worker processes, attached once per worker
+_shared = {}
+
+# Distance over which the fit of a pixel depends on the fits of other pixels: the neighbour
+# warm-start passes and fallback radius of fit_dtc_parameters (2 + 2), the fallback radius of
+# fit_atc_parameters (2)
+FIT_REACH = 4
+
+def iter_tiles(rows, cols, tile_size):
+    """
+    Splits a raster into blocks.
+
+    Args:
+        rows (int): Number of rows of the raster.
+        cols (int): Number of columns of the raster.
+        tile_size (int): Height and width of a tile.
+
+    Returns:
+        generator: (row_start, row_stop, col_start, col_stop) of each tile.
+    """
+    for r0 in range(0, rows, tile_size):
+        for c0 in range(0, cols, tile_size):
+            yield r0, min(r0 + tile_size, rows), c0, min(c0 + tile_size, cols)
+
+def select_base_array(cube, mask=None, count_mask=None):
+    """
+    Predict function for base temperatures that are already known, e.g. from cached parameters.
+
+    Pass the base array as a (rows, cols, 1) cube to reconstruct_tiled.
+
+    Args:
+        cube (numpy.ndarray): Base LST values with shape (rows, cols, 1).
+        mask (numpy.ndarray, optional): Boolean (rows, cols) array of pixels to keep. Defaults to all pixels.
+        count_mask (numpy.ndarray, optional): Unused, nothing is fitted. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Base LST values, zero outside the mask.
+    """
+    base_array = np.array(cube[:, :, 0], dtype=float)
+    if mask is not None:
+        base_array[~mask] = 0
+    return base_array
+
+def reconstruct_tile(cube, image, valid, predict, window_radius, tile, out=None):
+    """
+    Fits the base temperature and fills the missing pixels of one tile.
+
+    The tile is filled with a halo of window_radius pixels, fitted with a further
+    FIT_REACH pixels of context and masked with window_radius more, so the
+    result equals the one of the whole scene given the same predict function.
+    Fit counters only cover the pixels of the tile itself, so they add up to
+    those of the whole scene; the halo fits are counted as fits_halo.
+
+    Args:
+        cube (numpy.ndarray): Stack of pixel values with shape (rows, cols, T).
+        image (numpy.ndarray): 2D array of the image to reconstruct.
+        valid (numpy.ndarray): Boolean 2D array of the valid pixels of the image, see get_invalid_mask.
+        predict (callable): Function (cube, mask=mask, count_mask=core) returning the base LST of the masked
+            pixels, counting the fits of the core pixels only, e.g. a partial of predict_dtc_array.
+        window_radius (int): Radius of the moving window.
+        tile (tuple): (row_start, row_stop, col_start, col_stop) of the tile.
+        out (numpy.ndarray, optional): Preallocated array of the tile's shape to write into. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Reconstructed pixel values of the tile.
+    """
+    r0, r1, c0, c1 = tile
+    rows, cols = image.shape
+    r = window_radius
+
+    # Halo used for filling, the context of the fit and the wider context the gap mask needs
+    hr0, hr1, hc0, hc1 = max(0, r0 - r), min(rows, r1 + r), max(0, c0 - r), min(cols, c1 + r)
+    f = r + FIT_REACH
+    fr0, fr1, fc0, fc1 = max(0, r0 - f), min(rows, r1 + f), max(0, c0 - f), min(cols, c1 + f)
+    m = 2 * r + FIT_REACH
+    mr0, mr1, mc0, mc1 = max(0, r0 - m), min(rows, r1 + m), max(0, c0 - m), min(cols, c1 + m)
+    with stage('find_missing_pixels'):
+        mask = dilate_mask(~valid[mr0:mr1, mc0:mc1], r)
+        mask = mask[fr0 - mr0:fr1 - mr0, fc0 - mc0:fc1 - mc0]
+        # Only the halo is needed, the rest of the context only steers the fits of the halo
+        mask[:hr0 - fr0] = mask[hr1 - fr0:] = False
+        mask[:, :hc0 - fc0] = mask[:, hc1 - fc0:] = False
+
+        core = np.zeros_like(mask)
+        core[r0 - fr0:r1 - fr0, c0 - fc0:c1 - fc0] = True
+
+    base = predict(cube[fr0:fr1, fc0:fc1], mask=mask, count_mask=core)[hr0 - fr0:hr1 - fr0, hc0 - fc0:hc1 - fc0]
+
+    if out is None:
+        out = np.empty((r1 - r0, c1 - c0), dtype=LST_DTYPE)
+    out[...] = image[r0:r1, c0:c1]
+    centres = np.argwhere(~valid[r0:r1, c0:c1])
+
+    # The halo only stops short of window_radius at the image border, where the
+    # kernel reflects the window as m_window does
+    out[centres[:, 0], centres[:, 1]] = fill_missing_centres(image[hr0:hr1, hc0:hc1], base, centres + (r0 - hr0, c0 - hc0),
+                                                             r, valid=valid[hr0:hr1, hc0:hc1])
+    return out
+
+def _to_shared(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def _attach(specs, predict, window_radius, instrumented=False):
+    if instrumented:
+        # Workers only count, their numbers are sent back with each tile
+        enable_instrumentation()
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        _shared['shm_' + key] = shm
+    _shared['predict'] = predict
+    _shared['window_radius'] = window_radius
+
+def _run_tile(tile):
+    r0, r1, c0, c1 = tile
+    reconstruct_tile(_shared['cube'], _shared['image'], _shared['valid'], _shared['predict'], _shared['window_radius'],
+                     tile, out=_shared['output'][r0:r1, c0:c1])
+    return take_counters()
+
+def reconstruct_tiled(cube, image, valid, predict, window_radius, workers=1, tile_size=256, writer=None):
+    """
+    Reconstructs missing pixels tile by tile, optionally in a process pool.
+
+    The stack, image and validity mask are placed in shared memory once, so
+    only tile coordinates are sent to the workers, and each tile is written
+    straight into the output. The result does not depend on the number of
+    workers.
+
+    Args:
+        cube (numpy.ndarray): Stack of pixel values with shape (rows, cols, T).
+        image (numpy.ndarray): 2D array of the image to reconstruct.
+        valid (numpy.ndarray): Boolean 2D array of the valid pixels of the image, see get_invalid_mask.
+        predict (callable): Picklable function (cube, mask=mask, count_mask=core), see reconstruct_tile.
+        window_radius (int): Radius of the moving window.
+        workers (int, optional): Number of worker processes. Defaults to 1.
+        tile_size (int, optional): Height and width of a tile. Defaults to 256.
+        writer (callable, optional): Function (block, xoff, yoff) called with each finished tile,
+            e.g. a partial of write_block. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Array with estimated pixel values.
+    """
+    rows, cols = image.shape
+    tiles = list(iter_tiles(rows, cols, tile_size))
+
+    if workers <= 1 or len(tiles) == 1:
+        output = np.empty((rows, cols), dtype=LST_DTYPE)
+        for r0, r1, c0, c1 in tiles:
+            reconstruct_tile(cube, image, valid, predict, window_radius, (r0, r1, c0, c1), out=output[r0:r1, c0:c1])
+            if writer is not None:
+                writer(output[r0:r1, c0:c1], c0, r0)
+        return output
+
+    arrays = {'cube': cube, 'image': image, 'valid': valid, 'output': np.empty((rows, cols), dtype=LST_DTYPE)}
+    shms, specs = {}, {}
+    try:
+        for key, array in arrays.items():
+            shms[key], specs[key] = _to_shared(np.ascontiguousarray(array))
+        name, shape, dtype = specs['output']
+        shared_output = np.ndarray(shape, dtype=dtype, buffer=shms['output'].buf)
+        initargs = (specs, predict, window_radius, instrumentation_enabled())
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=initargs) as pool:
+            futures = {pool.submit(_run_tile, tile): tile for tile in tiles}
+            for future in as_completed(futures):
+                merge_counters(future.result())
+                if writer is not None:
+                    r0, r1, c0, c1 = futures[future]
+                    writer(shared_output[r0:r1, c0:c1], c0, r0)
+        output = shared_output.copy()
+        del shared_output
+    finally:
+        for shm in shms.values():
+            shm.close()
+            shm.unlink()
+
+    return output
+
+def iter_reconstructed_blocks(file_paths, input_file_path, predict, window_radius, memory_budget=256 * 2**20,
+                              image_range=(200, 400), nodata=None):
+    """
+    Reconstructs missing pixels window by window, reading only one window of the stack at a time.
+
+    Windows follow the native block structure of the input raster, so peak
+    memory is set by the memory budget rather than by the scene size. The
+    result does not depend on the budget as long as predict does not depend
+    on the window, e.g. with the p_start of read_dtc_scene_sums for the DTC.
+
+    Args:
+        file_paths (list): Paths to the LST files of the stack, in time order.
+        input_file_path (str): Path to the input raster file.
+        predict (callable): Function (cube, mask=mask, count_mask=core), see reconstruct_tile.
+        window_radius (int): Radius of the moving window.
+        memory_budget (int, optional): Bytes allowed for one stack window. Defaults to 256 MiB.
+        image_range (tuple, optional): Inclusive range of valid pixel values of the image. Defaults to (200, 400).
+        nodata (float, optional): No-data value of the image, see get_invalid_mask. Defaults to None.
+
+    Returns:
+        generator: (window, block) pairs, where window is (row_start, row_stop, col_start, col_stop).
+    """
+    rows, cols = raster_shape(input_file_path)
+    r = window_radius
+    input_dataset = gdal.Open(input_file_path)
+    datasets = [gdal.Open(file_path) for file_path in file_paths]  # Opened once, read window by window
+    buffer = np.empty(0, dtype=LST_DTYPE)  # Stack window buffer, reused by every window that fits
+
+    f, m = r + FIT_REACH, 2 * r + FIT_REACH
+    for window in iter_block_windows(input_file_path, len(file_paths), memory_budget, m):
+        r0, r1, c0, c1 = window
+
+        # Context of the gap mask and of the fit around the window, see reconstruct_tile
+        mr0, mr1, mc0, mc1 = max(0, r0 - m), min(rows, r1 + m), max(0, c0 - m), min(cols, c1 + m)
+        hr0, hr1, hc0, hc1 = max(0, r0 - f), min(rows, r1 + f), max(0, c0 - f), min(cols, c1 + f)
+        image = as_float_array(read_window(input_dataset, (mr0, mr1, mc0, mc1)))
+        valid = ~get_invalid_mask(image, *image_range, nodata)
+
+        # Only the fitting halo of the stack is read, the rest of the context is never accessed
+        shape = (mr1 - mr0, mc1 - mc0, len(file_paths))
+        if buffer.size < np.prod(shape):
+            buffer = np.empty(np.prod(shape), dtype=LST_DTYPE)
+        cube = buffer[:np.prod(shape)].reshape(shape)
+        read_stack_window(datasets, (hr0, hr1, hc0, hc1), out=cube[hr0 - mr0:hr1 - mr0, hc0 - mc0:hc1 - mc0])
+
+        tile = (r0 - mr0, r1 - mr0, c0 - mc0, c1 - mc0)
+        yield window, reconstruct_tile(cube, image, valid, predict, window_radius, tile)
@@ -1,17 +1,33 @@
-import time
 from osgeo import gdal
 import numpy as np
 
+# Pixel values of stacks, images and outputs are kept in float32, the precision of the LST products;
+# which pixels are valid is tracked in boolean masks rather than in the values. Fitted base temperatures
+# stay float64, as rounding them creates ties that change the weights of fill_missing_centres.
+LST_DTYPE = np.float32
+
 # Function to convert seconds to hours:minutes:seconds format
 def format_time(seconds):
     m, s = divmod(seconds, 60)
     h, m = divmod(m, 60)
     return "%d:%02d:%02d" % (h, m, s)
 
-def np_from_tif(tiffile):
+def array_from_tif(tiffile, dtype=None):
     df = gdal.Open(tiffile)
-    df_np = df.GetRasterBand(1).ReadAsArray()
-    df_np[(df_np < 200) | (df_np > 400)] = np.nan
+    array = df.GetRasterBand(1).ReadAsArray()
+    return array if dtype is None else array.astype(dtype, copy=False)
+
+# Function returning a floating point array, converting integer products to LST_DTYPE
+def as_float_array(array):
+    array = np.asarray(array)
+    return array if np.issubdtype(array.dtype, np.floating) else array.astype(LST_DTYPE)
+
+def set_invalid_to_nan(df_np, low=200, high=400):
+    df_np = as_float_array(df_np)
+    df_np[(df_np < low) | (df_np > high)] = np.nan
     return df_np
 
+def np_from_tif(tiffile, low=200, high=400):
+    return set_invalid_to_nan(array_from_tif(tiffile), low, high)
+
 
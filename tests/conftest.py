@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The command-line entry points (main_function, batch_run, watch_run) live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
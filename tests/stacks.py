@@ -0,0 +1,57 @@
+"""Small synthetic stacks shared by the tests."""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from osgeo import gdal
+
+from tempfil import LST_DTYPE, daytime_temperature_cycle, nighttime_temperature_cycle, get_acquisition_hours
+
+ROWS, COLS = 33, 29
+
+def diurnal_stack(seed=0):
+    """Half-hourly scenes of two days, with clouds and a few pixels seen only a couple of times."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2022, 12, 24, 6)
+    keys = [(start + timedelta(minutes=30 * k)).strftime('%Y%m%d_%H%M') for k in range(48)]
+    hours = get_acquisition_hours(keys)
+    level = 290 + 5 * rng.standard_normal((ROWS, COLS, 1))
+    day = daytime_temperature_cycle(np.minimum(hours, 18.9), 0, 12, 0, 13, 7)
+    night = nighttime_temperature_cycle(np.maximum(hours, 19), 0, 12, 0, 21, 7, 3, -0.5, 0.01)
+    cube = level + np.where(hours < 19, day, night) + rng.standard_normal((ROWS, COLS, len(keys)))
+    cube[rng.random(cube.shape) < 0.4] = np.nan
+    cube[rng.random((ROWS, COLS)) < 0.15, :-2] = np.nan
+    return keys, cube.astype(LST_DTYPE)
+
+def annual_stack(seed=0):
+    rng = np.random.default_rng(seed)
+    doys = np.arange(5, 365, 16)
+    keys = [datetime(2021, 1, 1) + timedelta(days=int(doy) - 1) for doy in doys]
+    cube = 295 + 10 * np.cos(2 * np.pi * (doys - 200) / 365) + rng.standard_normal((ROWS, COLS, len(doys)))
+    cube[rng.random(cube.shape) < 0.4] = np.nan
+    cube[rng.random((ROWS, COLS)) < 0.15, :-3] = np.nan
+    return keys, cube.astype(LST_DTYPE)
+
+def gappy_image(cube, seed=1):
+    rng = np.random.default_rng(seed)
+    image = np.nan_to_num(cube[:, :, 0], nan=300)
+    valid = rng.random(image.shape) > 0.3
+    valid[5:12, 4:20] = False
+    image[~valid] = np.nan
+    return image, valid
+
+def write_stack(folder_path, keys, cube, block_size=None):
+    """Writes each scene as Clip_<key>.tif, tiled in block_size blocks or stripped."""
+    os.makedirs(folder_path, exist_ok=True)
+    options = [] if block_size is None else ['TILED=YES', f'BLOCKXSIZE={block_size}', f'BLOCKYSIZE={block_size}']
+    file_paths = []
+    for t, key in enumerate(keys):
+        file_paths.append(os.path.join(folder_path, f'Clip_{key}.tif'))
+        write_tif(file_paths[-1], cube[:, :, t], options)
+    return file_paths
+
+def write_tif(file_path, array, options=()):
+    dataset = gdal.GetDriverByName('GTiff').Create(file_path, array.shape[1], array.shape[0], 1, gdal.GDT_Float32, list(options))
+    dataset.GetRasterBand(1).WriteArray(np.asarray(array, dtype=np.float32))
+    dataset.FlushCache()
+    dataset = None
@@ -0,0 +1,42 @@
+import numpy as np
+
+from stacks import ROWS, COLS, annual_stack
+from tempfil import (
+    FIT_NONE,
+    FIT_FULL,
+    FIT_REDUCED,
+    annual_temperature_cycle,
+    fit_atc_parameters,
+    predict_atc_array,
+    get_best_fit_parameters_and_lst,
+)
+
+DATE = '2021-07-04'
+
+def test_atc_fit_matches_curve_fit():
+    keys, cube = annual_stack()
+    base, quality = predict_atc_array(cube, keys, DATE, return_quality=True)
+    full = np.argwhere(quality.level == FIT_FULL)
+    assert len(full) > 0.5 * ROWS * COLS
+    for i, j in full:
+        pixel_values = {key.strftime('%Y-%m-%d'): value for key, value in zip(keys, cube[i, j].astype(float))
+                        if np.isfinite(value)}
+        assert abs(base[i, j] - get_best_fit_parameters_and_lst(DATE, pixel_values)) < 1e-4
+
+def test_atc_fallback_levels():
+    keys, cube = annual_stack()
+    doys = [key.timetuple().tm_yday for key in keys]
+    cube[0, 0] = cube[0, 1] = cube[0, 2] = np.nan
+    cube[0, 0, [2, 9, 16]] = 290, 300, 295   # Three observations: the reduced harmonic
+    cube[0, 1, [2, 9]] = 290       # Two: no fit
+    cube[0, 2, [2, 9, 16]] = 400   # Out of the valid range: no fit
+    params, quality = fit_atc_parameters(cube, doys, neighbour_radius=0, return_quality=True)
+
+    assert quality.level[0, 0] == FIT_REDUCED and quality.n_obs[0, 0] == 3
+    assert params[2, 0, 0] == 0 and np.all(np.isfinite(params[:, 0, 0]))
+    pixel_values = {keys[t].strftime('%Y-%m-%d'): float(cube[0, 0, t]) for t in (2, 9, 16)}
+    x = keys[0].replace(month=7, day=4).timetuple().tm_yday
+    assert abs(annual_temperature_cycle(x, *params[:, 0, 0]) - get_best_fit_parameters_and_lst(DATE, pixel_values)) < 1e-4
+    for j in (1, 2):
+        assert quality.level[0, j] == FIT_NONE and np.all(np.isnan(params[:, 0, j]))
+    assert quality.n_obs[0, 1] == 2 and quality.n_obs[0, 2] == 0
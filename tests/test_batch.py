@@ -0,0 +1,31 @@
+import json
+
+import batch_run
+from batch_run import run_batch, read_state
+
+def test_bad_job_does_not_stop_batch(tmp_path, monkeypatch):
+    folder_path = tmp_path / 'stack'
+    folder_path.mkdir()
+    (folder_path / 'Clip_20221224_0300.tif').write_bytes(b'0')
+    (tmp_path / 'input.tif').write_bytes(b'0')
+    jobs = [{'folder_path': str(path), 'input_file_path': str(tmp_path / 'input.tif'), 'time_of_day': '2022-12-24_0300',
+             'window_radius': 2, 'output_path': str(tmp_path / f'out_{n}.tif')}
+            for n, path in enumerate([folder_path, tmp_path / 'missing', folder_path])]
+    manifest_path = str(tmp_path / 'jobs.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(jobs, f)
+
+    ran = []
+    def run_job(job, *args):
+        ran.append(job['output_path'])
+        with open(job['output_path'], 'wb') as f:
+            f.write(b'0')
+
+    monkeypatch.setattr(batch_run, 'run_job', run_job)
+    assert run_batch(manifest_path) == {'done': 2, 'skipped': 0, 'failed': 1}
+    good = [jobs[0]['output_path'], jobs[2]['output_path']]
+    assert sorted(ran) == good
+    assert sorted(read_state(manifest_path + '.state.json')) == good
+
+    # The good jobs are up to date, the bad one fails again
+    assert run_batch(manifest_path) == {'done': 0, 'skipped': 2, 'failed': 1}
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from stacks import ROWS, COLS, diurnal_stack, write_stack
+from tempfil import (
+    get_acquisition_time,
+    get_acquisition_hours,
+    fit_dtc_parameters,
+    get_dtc_parameters,
+    get_atc_parameters,
+)
+
+@pytest.mark.parametrize('daytime', [True, False])
+def test_dtc_cache_hit_equals_fresh_run(tmp_path, daytime):
+    keys, cube = diurnal_stack()
+    write_stack(tmp_path / 'stack', keys, cube)
+    folder_path, cache_dir = str(tmp_path / 'stack'), str(tmp_path / 'cache')
+    first, second = np.zeros((ROWS, COLS), dtype=bool), np.zeros((ROWS, COLS), dtype=bool)
+    first[3:15, 2:12] = True
+    second[10:30, 8:25] = True
+
+    # Filling the cache over two masks, then reading both back without fitting
+    get_dtc_parameters(folder_path, cache_dir, daytime, first, get_acquisition_time)
+    get_dtc_parameters(folder_path, cache_dir, daytime, second, get_acquisition_time)
+    params, converged = get_dtc_parameters(folder_path, cache_dir, daytime, first | second, get_acquisition_time)
+
+    for mask in (first, second, first | second):
+        fresh_params, fresh_converged = fit_dtc_parameters(cube, get_acquisition_hours(keys), daytime, mask)
+        np.testing.assert_array_equal(params[:, mask], fresh_params[:, mask])
+        np.testing.assert_array_equal(converged[mask], fresh_converged[mask])
+
+def clip_date(file_name):
+    return datetime.strptime(get_acquisition_time(file_name), '%Y%m%d_%H%M')
+
+def fit_shared_cache(folder_path, cache_dir, mask):
+    atc = get_atc_parameters(folder_path, cache_dir, parse_key=clip_date)
+    dtc, _ = get_dtc_parameters(folder_path, cache_dir, True, mask, get_acquisition_time)
+    return np.array(atc), np.array(dtc)
+
+def test_concurrent_jobs_share_cache(tmp_path):
+    keys, cube = diurnal_stack()
+    write_stack(tmp_path / 'stack', keys, cube)
+    folder_path, cache_dir = str(tmp_path / 'stack'), str(tmp_path / 'cache')
+    masks = [np.zeros((ROWS, COLS), dtype=bool) for _ in range(6)]
+    for k, mask in enumerate(masks):
+        mask[4 * k:4 * k + 8] = True
+
+    # Jobs of one folder race on the same cache entries
+    with ProcessPoolExecutor(max_workers=len(masks)) as pool:
+        results = list(pool.map(fit_shared_cache, [folder_path] * len(masks), [cache_dir] * len(masks), masks))
+    atc, dtc = fit_shared_cache(folder_path, cache_dir, np.logical_or.reduce(masks))
+    for (job_atc, job_dtc), mask in zip(results, masks):
+        np.testing.assert_array_equal(job_atc, atc)
+        np.testing.assert_array_equal(job_dtc[:, mask], dtc[:, mask])
+    names = [name for entry in os.listdir(cache_dir) for name in os.listdir(os.path.join(cache_dir, entry))]
+    assert not [name for name in names if name.endswith('.tmp')]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from stacks import ROWS, COLS, diurnal_stack, write_stack, write_tif
+from tempfil import HIMAWARI, get_parse_key, load_stack, predict_dtc_array, get_dtc_array, find_missing_mask
+
+TIME = '2022-12-25_1500'
+
+def test_dtc_array_fits_only_the_gaps(tmp_path):
+    keys, cube = diurnal_stack()
+    folder_path = str(tmp_path / 'stack')
+    write_stack(folder_path, keys, cube)
+    image = np.nan_to_num(cube[:, :, 0], nan=300)
+    image[5:12, 4:20] = np.nan
+    input_file_path = str(tmp_path / 'image.tif')
+    write_tif(input_file_path, image)
+    mask = find_missing_mask(input_file_path, 2)
+    assert mask.sum() == 11 * 20
+
+    base = get_dtc_array(input_file_path, folder_path, TIME, 2)
+    assert base.shape == (ROWS, COLS)
+    stack = load_stack(folder_path, get_parse_key(HIMAWARI, 'diurnal'))
+    everywhere = predict_dtc_array(stack.cube, stack.keys, TIME)
+    # Pixels outside the gaps and their window are not fitted, the others as in a fit of every pixel
+    assert np.all(base[~mask] == 0)
+    np.testing.assert_allclose(base[mask], everywhere[mask], rtol=0, atol=1e-6)
+
+    cached = get_dtc_array(input_file_path, folder_path, TIME, 2, cache_dir=str(tmp_path / 'cache'))
+    np.testing.assert_array_equal(cached, base)
+
+    write_tif(input_file_path, image[:, :COLS - 1])
+    with pytest.raises(ValueError, match='shape'):
+        get_dtc_array(input_file_path, folder_path, TIME, 2)
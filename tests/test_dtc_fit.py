@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_dtc_stack
+from tempfil import (
+    FIT_FULL,
+    load_stack,
+    get_hkt_acquisition_time,
+    get_acquisition_hours,
+    fit_dtc_parameters,
+    evaluate_dtc,
+    get_dtc_best_fit_parameters_and_lst,
+)
+
+SIZE = 16
+
+def true_lst(params, x):
+    """LST of make_dtc_stack without noise: the daytime model, then exponential cooling from 19:00."""
+    T0, Ta, _, tm, tsr = params
+    omega = (4 / 3) * (tm - tsr)
+    if x < 19:
+        return T0 + Ta * np.cos(np.pi / omega * (x - tm))
+    return T0 + Ta * np.cos(np.pi / omega * (19 - tm)) - 4 * (1 - np.exp(-(x - 19) / 4))
+
+@pytest.mark.parametrize('time, max_median, max_far, far', [
+    ('2022-12-24_1000', 1e-5, 0, 1e-3),
+    # Eight parameters from eleven night scenes: some pixels reach another minimum than curve_fit
+    ('2022-12-24_2200', 0.1, 0.05, 1.0),
+])
+def test_dtc_fit_matches_curve_fit(tmp_path, time, max_median, max_far, far):
+    case = make_dtc_stack(str(tmp_path), SIZE)
+    stack = load_stack(str(tmp_path), get_hkt_acquisition_time)
+    x = int(time[-4:-2])
+    params, converged, quality = fit_dtc_parameters(stack.cube, get_acquisition_hours(stack.keys), x < 19, return_quality=True)
+    lst = evaluate_dtc(params, time)
+    reference = np.array([[get_dtc_best_fit_parameters_and_lst(time, dict(zip(stack.keys, stack.cube[i, j].astype(float))))
+                           for j in range(SIZE)] for i in range(SIZE)])
+
+    full = quality.level == FIT_FULL
+    assert np.mean(~converged[full]) < 0.25
+    compared = full & np.isfinite(reference)
+    difference = np.abs(lst - reference)[compared]
+    assert np.median(difference) < max_median
+    assert np.mean(difference > far) <= max_far
+
+    # As close to the truth as curve_fit
+    truth = true_lst(case['params'], x)
+    rmse = lambda estimate: np.sqrt(np.mean((estimate - truth)[compared] ** 2))
+    assert rmse(lst) < 1.25 * rmse(reference)
@@ -0,0 +1,36 @@
+from functools import partial
+
+import numpy as np
+from osgeo import gdal
+
+from stacks import annual_stack, gappy_image, write_stack
+from tempfil import LST_DTYPE, np_from_tif, read_stack, predict_atc_array, reconstruct_tiled
+
+def test_integer_products_read_as_float32(tmp_path):
+    file_path = str(tmp_path / 'uint16.tif')
+    values = np.array([[0, 250, 300], [401, 350, 65535]], dtype=np.uint16)
+    dataset = gdal.GetDriverByName('GTiff').Create(file_path, 3, 2, 1, gdal.GDT_UInt16)
+    dataset.GetRasterBand(1).WriteArray(values)
+    dataset.FlushCache()
+    dataset = None
+
+    array = np_from_tif(file_path)
+    assert array.dtype == LST_DTYPE
+    np.testing.assert_array_equal(array, [[np.nan, 250, 300], [np.nan, 350, np.nan]])
+
+def test_invalid_pixels_only_known_by_the_mask(tmp_path):
+    keys, cube = annual_stack()
+    file_paths = write_stack(str(tmp_path / 'stack'), [f'{key:%Y%m%d}' for key in keys], cube)
+    stack_cube = read_stack(file_paths)
+    assert stack_cube.dtype == LST_DTYPE
+    np.testing.assert_array_equal(stack_cube, cube)
+
+    # The values of the invalid pixels, NaN or a no-data value, are never read
+    image, valid = gappy_image(cube)
+    predict = partial(predict_atc_array, acquisition_dates=keys, date='2021-07-04')
+    outputs = [reconstruct_tiled(stack_cube, np.where(valid, image, fill).astype(LST_DTYPE), valid, predict, 2, tile_size=11)
+               for fill in (np.nan, 999)]
+    assert outputs[0].dtype == LST_DTYPE
+    np.testing.assert_array_equal(outputs[0], outputs[1])
+    np.testing.assert_array_equal(outputs[0][valid], image[valid])
+    assert np.all(np.isfinite(outputs[0]))
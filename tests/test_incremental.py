@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+
+from stacks import diurnal_stack, write_stack
+import tempfil.incremental
+from tempfil import get_acquisition_time, get_dtc_state
+
+def hourly_sums(keys, cube):
+    sums, counts = np.zeros((24,) + cube.shape[:2]), np.zeros((24,) + cube.shape[:2], dtype=np.int32)
+    for t, key in enumerate(keys):
+        with np.errstate(invalid='ignore'):
+            valid = cube[:, :, t] >= 260
+        sums[int(key[-4:-2])] += np.where(valid, cube[:, :, t], 0)
+        counts[int(key[-4:-2])] += valid
+    return sums, counts
+
+def test_rolling_state_equals_rebuild(tmp_path, monkeypatch):
+    keys, cube = diurnal_stack()
+    folder_path = str(tmp_path / 'stack')
+    file_paths = write_stack(folder_path, keys[:30], cube[:, :, :30])
+    state = get_dtc_state(folder_path, str(tmp_path / 'cache'), get_acquisition_time, window_days=0.5)
+    # 24 scenes in the last 12 hours, the first one excluded
+    np.testing.assert_array_equal(state.counts, hourly_sums(keys[6:30], cube[:, :, 6:30])[1])
+
+    # Ten new scenes: ten are added and ten leave the window, the others are not read again
+    file_paths += write_stack(folder_path, keys[30:40], cube[:, :, 30:40])
+    read = []
+    array_from_tif = tempfil.incremental.array_from_tif
+    monkeypatch.setattr(tempfil.incremental, 'array_from_tif', lambda file_path: read.append(file_path) or array_from_tif(file_path))
+    state = get_dtc_state(folder_path, str(tmp_path / 'cache'), get_acquisition_time, window_days=0.5)
+    assert sorted(read) == sorted(file_paths[6:16] + file_paths[30:40])
+
+    rebuilt = get_dtc_state(folder_path, str(tmp_path / 'rebuilt'), get_acquisition_time, window_days=0.5)
+    sums, counts = hourly_sums(keys[16:40], cube[:, :, 16:40])
+    np.testing.assert_array_equal(state.counts, counts)
+    np.testing.assert_array_equal(rebuilt.counts, counts)
+    np.testing.assert_allclose(state.sums, rebuilt.sums, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(rebuilt.sums, sums, rtol=0, atol=1e-9)
+
+    # A scene removed from the window cannot be subtracted, the state is rebuilt
+    read.clear()
+    os.remove(file_paths[20])
+    state = get_dtc_state(folder_path, str(tmp_path / 'cache'), get_acquisition_time, window_days=0.5)
+    assert len(read) == 23
+    np.testing.assert_array_equal(state.counts, hourly_sums(keys[16:20] + keys[21:40],
+                                                          cube[:, :, np.r_[16:20, 21:40]])[1])
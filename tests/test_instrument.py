@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+
+from tempfil import enable_instrumentation, disable_instrumentation, instrumentation_enabled, stage, count
+
+def test_runs_are_per_thread():
+    barrier = threading.Barrier(2)
+    reports = {}
+
+    def job(name, n):
+        enable_instrumentation()
+        # Both runs are open at once, the first one to finish must not end the other
+        barrier.wait()
+        for _ in range(n):
+            with stage('fit'):
+                count('fits_attempted')
+        barrier.wait()
+        reports[name] = disable_instrumentation()
+
+    threads = [threading.Thread(target=job, args=(name, n)) for name, n in (('a', 3), ('b', 5))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not instrumentation_enabled()
+    assert reports['a']['counters'] == {'fits_attempted': 3} and reports['a']['stages']['fit']['calls'] == 3
+    assert reports['b']['counters'] == {'fits_attempted': 5} and reports['b']['stages']['fit']['calls'] == 5
+
+def test_nested_stage_keeps_the_outer_peak():
+    enable_instrumentation(trace_memory=True)
+    with stage('outer'):
+        block = np.ones(2**22)  # 32 MiB, freed before the nested stage
+        del block
+        with stage('inner'):
+            small = np.ones(2**10)
+            del small
+    stages = disable_instrumentation()['stages']
+    assert stages['outer']['peak_mb'] >= 32
+    assert stages['inner']['peak_mb'] < 32
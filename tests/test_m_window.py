@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from tempfil import rec_lst, m_window
+
+def padded_m_window(ts, atc, window_radius):
+    """m_window as first written: rec_lst over every window of the reflect-padded images."""
+    padimage_1 = np.pad(ts, window_radius, 'reflect')
+    padimage_2 = np.pad(atc, window_radius, 'reflect')
+    output = np.zeros_like(ts)
+    for i in range(ts.shape[0]):
+        for j in range(ts.shape[1]):
+            window = np.s_[i:i + 2 * window_radius + 1, j:j + 2 * window_radius + 1]
+            output[i, j] = rec_lst(padimage_1[window], padimage_2[window])
+    return output
+
+def scene(shape, ties, seed=0):
+    rng = np.random.default_rng(seed)
+    atc = 290 + 10 * rng.random(shape)
+    if ties:
+        # Equal ATC values, at zero distance and on the similarity threshold
+        atc = np.round(atc)
+    ts = atc + rng.normal(0, 1, shape)
+    ts[rng.random(shape) < 0.3] = np.nan
+    return ts, atc
+
+@pytest.mark.parametrize('window_radius', [1, 2, 3, 4, 5])
+@pytest.mark.parametrize('shape', [(13, 13), (9, 17), (21, 6)])
+@pytest.mark.parametrize('ties', [False, True])
+def test_m_window_matches_padded_windows(window_radius, shape, ties):
+    ts, atc = scene(shape, ties)
+    np.testing.assert_allclose(m_window(ts, atc, window_radius), padded_m_window(ts, atc, window_radius),
+                               rtol=1e-13, atol=0)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from stacks import ROWS, COLS
+from tempfil import (
+    annual_temperature_cycle,
+    build_neighbour_index,
+    fill_from_neighbour_index,
+    m_window,
+    window_std,
+)
+from tempfil.pred_temp import _gather_windows
+
+def atc_scene(seed=0):
+    """ATC parameter grids with a few unfitted (NaN) pixels, and a cloudy scene of day 200."""
+    rng = np.random.default_rng(seed)
+    params = np.stack([rng.uniform(8, 14, (ROWS, COLS)), rng.uniform(-1.6, -1.2, (ROWS, COLS)),
+                       rng.uniform(-0.005, 0.005, (ROWS, COLS)), rng.uniform(290, 300, (ROWS, COLS))])
+    params[:, rng.random((ROWS, COLS)) < 0.02] = np.nan
+    atc = annual_temperature_cycle(200, *params)
+    ts = atc + rng.normal(0, 1, atc.shape)
+    ts[rng.random(ts.shape) < 0.3] = np.nan
+    return params, atc, ts
+
+@pytest.mark.parametrize('window_radius', [1, 3])
+def test_window_std_matches_windows(window_radius):
+    _, atc, _ = atc_scene()
+    ci, cj = np.indices(atc.shape).reshape(2, -1)
+    size = 2 * window_radius + 1
+    windows = _gather_windows(atc, ci, cj, window_radius, np.empty((len(ci), size * size)))
+    expected = np.std(windows, axis=1).reshape(atc.shape)
+    np.testing.assert_array_equal(np.isnan(window_std(atc, window_radius)), np.isnan(expected))
+    np.testing.assert_allclose(window_std(atc, window_radius), expected, rtol=1e-9, equal_nan=True)
+
+@pytest.mark.parametrize('window_radius', [1, 3])
+def test_index_fill_matches_m_window(window_radius):
+    params, atc, ts = atc_scene()
+    assert np.any(np.isnan(atc))
+    centres = np.argwhere(np.isnan(ts))
+    index = build_neighbour_index(params, window_radius, [200], np.isnan(ts), slack=1.0)
+    estimates = fill_from_neighbour_index(ts, atc, centres, index)
+    expected = m_window(ts, atc, window_radius)[centres[:, 0], centres[:, 1]]
+    np.testing.assert_allclose(estimates, expected, rtol=1e-12, equal_nan=True)
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+from osgeo import gdal
+
+from stacks import diurnal_stack, write_stack, write_tif
+from tempfil import HIMAWARI, get_invalid_mask, find_missing_mask, create_georeferenced_tif
+import main_function
+
+def test_nodata_is_invalid_within_the_range(tmp_path):
+    image = np.full((9, 9), 300.0, dtype=np.float32)
+    image[4, 4] = 250.0
+    image[0, 0] = 999.0
+    invalid = get_invalid_mask(image, 200, 400, nodata=250.0)
+    assert invalid.sum() == 2 and invalid[4, 4] and invalid[0, 0]
+    assert get_invalid_mask(image, 200, 400).sum() == 1
+
+    input_file_path = str(tmp_path / 'image.tif')
+    write_tif(input_file_path, image)
+    mask = find_missing_mask(input_file_path, 1, 200, 400, nodata=250.0)
+    assert mask[3:6, 3:6].all() and mask.sum() == 9 + 4
+
+def test_unfilled_pixels_written_as_nodata(tmp_path):
+    reference_tif = str(tmp_path / 'reference.tif')
+    write_tif(reference_tif, np.zeros((5, 7)))
+    array = np.full((5, 7), 300.0)
+    array[2, 3] = np.nan
+    output_path = str(tmp_path / 'output.tif')
+    create_georeferenced_tif(reference_tif, array, output_path, nodata=999.0)
+
+    band = gdal.Open(output_path).GetRasterBand(1)
+    assert band.GetNoDataValue() == 999.0
+    written = band.ReadAsArray()
+    assert written[2, 3] == 999.0 and np.all(np.delete(written.ravel(), 2 * 7 + 3) == 300.0)
+
+def test_outputs_carry_the_sensor_nodata(tmp_path):
+    keys, cube = diurnal_stack()
+    folder_path = str(tmp_path / 'stack')
+    write_stack(folder_path, keys, cube)
+    input_file_path = os.path.join(folder_path, sorted(os.listdir(folder_path))[-1])
+
+    output_path = str(tmp_path / 'output.tif')
+    main_function.main(folder_path, input_file_path, None, 2, output_path, 'diurnal', '2022-12-24_2000', tile_size=11)
+    nodata = gdal.Open(output_path).GetRasterBand(1).GetNoDataValue()
+    assert np.float32(nodata) == np.float32(HIMAWARI.nodata)
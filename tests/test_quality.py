@@ -0,0 +1,59 @@
+import numpy as np
+
+from stacks import diurnal_stack
+from tempfil import (
+    FIT_NONE,
+    FIT_FULL,
+    FIT_REDUCED,
+    FIT_NEIGHBOURS,
+    fill_from_neighbours,
+    daytime_temperature_cycle,
+    get_acquisition_hours,
+    dtc_scene_sums,
+    dtc_start_parameters,
+    fit_dtc_parameters,
+)
+
+def test_fill_from_neighbours():
+    level = np.full((5, 6), FIT_NONE, dtype=np.int8)
+    params = np.full((2, 5, 6), np.nan)
+    level[0, 0], params[:, 0, 0] = FIT_FULL, (1, 10)
+    level[1, 1], params[:, 1, 1] = FIT_REDUCED, (3, 20)
+    mask = np.ones((5, 6), dtype=bool)
+    mask[0, 1] = False
+
+    filled, spread = fill_from_neighbours(params, level, mask, radius=1)
+    # Mean and spread of the fitted pixels in the window, the pixels out of reach or of the mask are left alone
+    np.testing.assert_array_equal(params[:, 1, 0], (2, 15))
+    np.testing.assert_array_equal(spread[:, 1, 0], (1, 5))
+    np.testing.assert_array_equal(params[:, 2, 2], (3, 20))
+    np.testing.assert_array_equal(spread[:, 2, 2], (0, 0))
+    assert filled.sum() == 6 and not filled[0, 1] and not filled[0, 0]
+    assert np.all(level[filled] == FIT_NEIGHBOURS) and level[0, 1] == FIT_NONE
+    assert np.all(np.isnan(params[:, 3:, :])) and np.all(np.isnan(params[:, :, 3:]))
+
+def test_dtc_fallback_levels():
+    keys, cube = diurnal_stack()
+    hours = get_acquisition_hours(keys)
+    day = (hours >= 6) & (hours < 19)
+    cube[0, 0, day] = cube[0, 1, day] = np.nan
+    cube[0, 0, np.nonzero(day)[0][[3, 10]]] = 295, 305   # Two observations for five parameters
+    p_start = dtc_start_parameters(hours, True, *dtc_scene_sums(cube))
+    params, converged, quality = fit_dtc_parameters(cube, hours, True, return_quality=True, p_start=p_start)
+
+    # Reduced fit: the start curve shifted to the mean offset of the pixel's observations
+    assert quality.level[0, 0] == FIT_REDUCED and quality.n_obs[0, 0] == 2
+    np.testing.assert_array_equal(params[1:, 0, 0], p_start[1:])
+    offsets = cube[0, 0, np.nonzero(day)[0][[3, 10]]] - daytime_temperature_cycle(hours[day][[3, 10]], *p_start)
+    np.testing.assert_allclose(params[0, 0, 0], p_start[0] + offsets.mean())
+    assert np.isfinite(quality.std_error[0, 0, 0]) and np.all(np.isnan(quality.std_error[1:, 0, 0]))
+
+    # No observation: the mean of the fitted pixels around it
+    assert quality.level[0, 1] == FIT_NEIGHBOURS and quality.n_obs[0, 1] == 0
+    fitted = (quality.level[:3, :4] == FIT_FULL) | (quality.level[:3, :4] == FIT_REDUCED)
+    np.testing.assert_allclose(params[:, 0, 1], params[:, :3, :4][:, fitted].mean(axis=1))
+
+    full = quality.level == FIT_FULL
+    assert full.mean() > 0.8
+    # Parameters the daytime scenes pin down have a standard error, e.g. the level and the amplitude
+    assert np.all(quality.n_obs[full] >= 5) and np.all(np.isfinite(quality.std_error[:2, full]))
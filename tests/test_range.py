@@ -0,0 +1,26 @@
+import os
+
+import numpy as np
+from osgeo import gdal
+
+from stacks import diurnal_stack, write_stack
+from tempfil import HIMAWARI, parse_local_time, array_from_tif
+import main_function
+
+def test_diurnal_range_equals_per_scene_runs(tmp_path, tile_size=11):
+    keys, cube = diurnal_stack()
+    folder_path = str(tmp_path / 'stack')
+    write_stack(folder_path, keys, cube)
+
+    # Local times of the range span the daytime and the nighttime model
+    output_path = str(tmp_path / 'range.tif')
+    labels = main_function.main_range(folder_path, '2022-12-24_1700', '2022-12-24_2000', 2, output_path, 'diurnal',
+                                      tile_size=tile_size)
+    assert len(labels) == 7
+    dataset = gdal.Open(output_path)
+    local_times = {parse_local_time(name, HIMAWARI): name for name in os.listdir(folder_path)}
+    for k, label in enumerate(labels):
+        scene_path = os.path.join(folder_path, local_times[label.replace('-', '')])
+        main_function.main(folder_path, scene_path, None, 2, str(tmp_path / 'scene.tif'), 'diurnal', label,
+                           tile_size=tile_size)
+        np.testing.assert_array_equal(dataset.GetRasterBand(k + 1).ReadAsArray(), array_from_tif(str(tmp_path / 'scene.tif')))
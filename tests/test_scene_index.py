@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from stacks import ROWS, COLS, annual_stack, write_stack
+import tempfil.scene_index
+from tempfil import SceneInfo, build_scene_index, select_scenes, read_selected_scenes
+
+def scene(key, valid_fraction=1.0):
+    return SceneInfo(key, f'{key:%Y%m%d}.tif', valid_fraction)
+
+def test_select_scenes_closest_first():
+    index = [scene(date(2019, 6, 1)), scene(date(2020, 6, 20)), scene(date(2020, 12, 25)), scene(date(2021, 5, 25)),
+             scene(date(2021, 6, 10), 0.0), scene(date(2022, 6, 5), 0.2)]
+    keys = [s.key for s in select_scenes(index, '2021-06-05')]
+    # Scenes without valid pixels are left out, the others are sorted by day of year, then by year
+    assert keys == [date(2022, 6, 5), date(2019, 6, 1), date(2021, 5, 25), date(2020, 6, 20), date(2020, 12, 25)]
+
+    keys = [s.key for s in select_scenes(index, '2021-06-05', seasonal_window=12)]
+    assert keys == [date(2022, 6, 5), date(2019, 6, 1), date(2021, 5, 25)]
+    # Ties between years as far from the target keep the earlier one
+    keys = [s.key for s in select_scenes(index, '2021-06-05', nearest_years=2)]
+    assert keys == [date(2021, 5, 25), date(2020, 6, 20), date(2020, 12, 25)]
+    keys = [s.key for s in select_scenes(index, '2021-06-05', min_valid_fraction=0.5)]
+    assert date(2022, 6, 5) not in keys and len(keys) == 4
+
+def clip_date(file_name):
+    return datetime.strptime(file_name[5:13], '%Y%m%d').date()
+
+def test_read_selected_scenes_stops_at_min_observations(tmp_path, monkeypatch):
+    keys, cube = annual_stack()
+    keys = [key.date() for key in keys]
+    folder_path = str(tmp_path / 'stack')
+    write_stack(folder_path, [f'{key:%Y%m%d}' for key in keys], cube)
+    index = build_scene_index(folder_path, clip_date, cache_dir=str(tmp_path / 'cache'))
+    assert [s.key for s in index] == keys
+    with np.errstate(invalid='ignore'):
+        valid = (cube >= 265) & (cube <= 320)
+    np.testing.assert_allclose([s.valid_fraction for s in index], valid.mean(axis=(0, 1)))
+
+    mask = np.zeros((ROWS, COLS), dtype=bool)
+    mask[:10, :10] = True
+    mask &= valid.sum(axis=2) >= 3
+    scenes = select_scenes(index, '2021-12-15')
+    stack = read_selected_scenes(scenes, mask, min_observations=3)
+    # The closest scenes are read until every masked pixel has three observations, then returned in time order
+    assert stack.keys == sorted(stack.keys) and len(stack.keys) < len(keys)
+    chosen = [keys.index(key) for key in stack.keys]
+    assert np.all(valid[mask][:, chosen].sum(axis=1) >= 3)
+    fewer = sorted(chosen, key=lambda t: [s.key for s in scenes].index(keys[t]))[:-1]
+    assert not np.all(valid[mask][:, fewer].sum(axis=1) >= 3)
+    np.testing.assert_array_equal(stack.cube, cube[:, :, chosen])
+
+    # A cached index is read back without opening the scenes again
+    monkeypatch.setattr(tempfil.scene_index, 'scene_valid_fraction', None)
+    assert build_scene_index(folder_path, clip_date, cache_dir=str(tmp_path / 'cache')) == index
@@ -0,0 +1,28 @@
+from datetime import date
+
+import pytest
+
+from tempfil import LANDSAT, HIMAWARI, MODIS, parse_acquisition_date, parse_local_time
+
+@pytest.mark.parametrize('file_name', [
+    'LC08_L1TP_122044_20131028_20200912_02_T1.tif.tif',
+    'LC09_L2SP_122044_20131028_20220101_02_T1_ST_B10.TIF',
+    'LT05_L2SP_122044_20131028_20200908_02_T1_ST_B6.TIF',
+    'LE07_L2SP_122044_20131028_20200908_02_T1_ST_B6.TIF',
+    'LT04_L1TP_122044_20131028_20200908_02_T1.tif',
+    'Clip_LC08_L1TP_122044_20131028_20200912_02_T1.tif',
+    'Clip_L8_122044_20131028_lst.tif',
+])
+def test_landsat_names(file_name):
+    assert parse_acquisition_date(file_name, LANDSAT) == date(2013, 10, 28)
+
+def test_himawari_and_modis_names():
+    assert parse_local_time('Clip_20221224_1600.tif', HIMAWARI) == '20221225_0000'
+    assert parse_acquisition_date('MOD11A1.A2021032.h28v06.061.tif', MODIS) == date(2021, 2, 1)
+
+def test_unknown_name_names_the_sensor_option():
+    with pytest.raises(ValueError, match='sensor'):
+        parse_acquisition_date('scene_2013.tif', LANDSAT)
+    # Profiles with a time of day do not fall back to a date alone
+    with pytest.raises(ValueError, match='sensor'):
+        parse_local_time('H08_20221224_lst.tif', HIMAWARI)
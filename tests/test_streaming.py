@@ -0,0 +1,57 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+from stacks import diurnal_stack, annual_stack, gappy_image, write_stack, write_tif
+from tempfil import (
+    LST_DTYPE,
+    dtc_scene_sums,
+    read_dtc_scene_sums,
+    dtc_start_parameters,
+    get_acquisition_hours,
+    predict_dtc_array,
+    predict_atc_array,
+    reconstruct_tiled,
+    iter_reconstructed_blocks,
+)
+
+# Budgets of 16x16 windows and of the whole scene, for a 48-scene stack in 16x16 blocks and a halo of 8
+SMALL_BUDGET, LARGE_BUDGET = 32**2 * 4 * 48, 2**30
+
+def stream(file_paths, input_file_path, predict, memory_budget, shape):
+    output = np.empty(shape, dtype=LST_DTYPE)
+    windows = 0
+    for (r0, r1, c0, c1), block in iter_reconstructed_blocks(file_paths, input_file_path, predict, 2, memory_budget):
+        output[r0:r1, c0:c1] = block
+        windows += 1
+    return output, windows
+
+def check_streaming(tmp_path, keys, cube, predict):
+    file_paths = write_stack(tmp_path / 'stack', keys, cube, block_size=16)
+    image, valid = gappy_image(cube)
+    write_tif(str(tmp_path / 'input.tif'), image, ['TILED=YES', 'BLOCKXSIZE=16', 'BLOCKYSIZE=16'])
+
+    expected = reconstruct_tiled(cube, image, valid, predict, 2)
+    small, windows = stream(file_paths, str(tmp_path / 'input.tif'), predict, SMALL_BUDGET, image.shape)
+    large, one = stream(file_paths, str(tmp_path / 'input.tif'), predict, LARGE_BUDGET, image.shape)
+    assert windows > 1 and one == 1
+    np.testing.assert_array_equal(small, expected)
+    np.testing.assert_array_equal(large, expected)
+
+@pytest.mark.parametrize('time', ['2022-12-24_1100', '2022-12-25_0000'])
+def test_diurnal_streaming_independent_of_budget(tmp_path, time):
+    keys, cube = diurnal_stack()
+    file_paths = write_stack(tmp_path / 'sums', keys, cube, block_size=16)
+    sums = read_dtc_scene_sums(file_paths, memory_budget=SMALL_BUDGET)
+    for streamed, loaded in zip(sums, dtc_scene_sums(cube)):
+        np.testing.assert_array_equal(streamed, loaded)
+
+    daytime = time.endswith('1100')
+    p_start = dtc_start_parameters(get_acquisition_hours(keys), daytime, *sums)
+    check_streaming(tmp_path, keys, cube, partial(predict_dtc_array, acquisition_times=keys, time=time, p_start=p_start))
+
+def test_annual_streaming_independent_of_budget(tmp_path):
+    keys, cube = annual_stack()
+    check_streaming(tmp_path, [key.strftime('%Y%m%d_0000') for key in keys], cube,
+                    partial(predict_atc_array, acquisition_dates=keys, date='2021-07-04'))
@@ -0,0 +1,79 @@
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+import pytest
+
+from stacks import ROWS, COLS, diurnal_stack, annual_stack, gappy_image
+from tempfil import (
+    dtc_scene_sums,
+    dtc_start_parameters,
+    get_acquisition_hours,
+    enable_instrumentation,
+    disable_instrumentation,
+    predict_dtc_array,
+    predict_atc_array,
+    reconstruct_tiled,
+)
+
+def reconstruct_all_tile_sizes(cube, predict, window_radius=2):
+    image, valid = gappy_image(cube)
+    return {tile_size: reconstruct_tiled(cube, image, valid, predict, window_radius, tile_size=tile_size)
+            for tile_size in (8, 11, max(ROWS, COLS))}
+
+@pytest.mark.parametrize('time', ['2022-12-24_1100', '2022-12-24_2200', '2022-12-25_0000'])
+def test_diurnal_independent_of_tile_size(time):
+    keys, cube = diurnal_stack()
+    daytime = 6 <= datetime.strptime(time, '%Y-%m-%d_%H%M').hour < 19
+    p_start = dtc_start_parameters(get_acquisition_hours(keys), daytime, *dtc_scene_sums(cube))
+    outputs = reconstruct_all_tile_sizes(cube, partial(predict_dtc_array, acquisition_times=keys, time=time, p_start=p_start))
+    full = outputs.pop(max(ROWS, COLS))
+    assert np.all(np.isfinite(full))
+    for output in outputs.values():
+        np.testing.assert_array_equal(output, full)
+
+def test_annual_independent_of_tile_size():
+    keys, cube = annual_stack()
+    outputs = reconstruct_all_tile_sizes(cube, partial(predict_atc_array, acquisition_dates=keys, date='2021-07-04'))
+    full = outputs.pop(max(ROWS, COLS))
+    for output in outputs.values():
+        np.testing.assert_array_equal(output, full)
+
+def test_dtc_fit_independent_of_mask():
+    keys, cube = diurnal_stack()
+    mask = np.zeros((ROWS, COLS), dtype=bool)
+    mask[10:20, 10:20] = True
+    whole = predict_dtc_array(cube, keys, '2022-12-24_2200')
+    masked = predict_dtc_array(cube, keys, '2022-12-24_2200', mask)
+    np.testing.assert_array_equal(masked[mask], whole[mask])
+    assert not np.any(masked[~mask])
+
+def test_scene_sums_add_up_over_blocks():
+    _, cube = diurnal_stack()
+    sums, counts = dtc_scene_sums(cube)
+    block_sums, block_counts = zip(*(dtc_scene_sums(cube[r0:r0 + 7]) for r0 in range(0, ROWS, 7)))
+    np.testing.assert_array_equal(np.sum(block_sums, axis=0), sums)
+    np.testing.assert_array_equal(np.sum(block_counts, axis=0), counts)
+
+def fit_counters(cube, predict, tile_size):
+    image, valid = gappy_image(cube)
+    enable_instrumentation()
+    try:
+        reconstruct_tiled(cube, image, valid, predict, 2, tile_size=tile_size)
+    finally:
+        report = disable_instrumentation()
+    return {name: n for name, n in report['counters'].items() if name.startswith('fits_') and name != 'fits_halo'}
+
+@pytest.mark.parametrize('diurnal', [True, False])
+def test_fit_counters_independent_of_tile_size(diurnal):
+    if diurnal:
+        keys, cube = diurnal_stack()
+        p_start = dtc_start_parameters(get_acquisition_hours(keys), False, *dtc_scene_sums(cube))
+        predict = partial(predict_dtc_array, acquisition_times=keys, time='2022-12-24_2200', p_start=p_start)
+    else:
+        keys, cube = annual_stack()
+        predict = partial(predict_atc_array, acquisition_dates=keys, date='2021-07-04')
+    full = fit_counters(cube, predict, max(ROWS, COLS))
+    assert full['fits_attempted'] > 0
+    for tile_size in (8, 11):
+        assert fit_counters(cube, predict, tile_size) == full
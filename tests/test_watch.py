@@ -0,0 +1,55 @@
+import watch_run
+from watch_run import find_arrivals, record_failure, watch
+from tempfil import HIMAWARI
+
+def touch(file_path, content=b'0'):
+    with open(file_path, 'ab') as f:
+        f.write(content)
+
+def test_arrivals_wait_for_stable_files(tmp_path):
+    file_path = str(tmp_path / 'Clip_20221224_0300.tif')
+    touch(file_path)
+    seen, last_sizes = {}, {}
+    assert find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes) == []
+    # Still being copied
+    touch(file_path)
+    assert find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes) == []
+    assert [arrival[1] for arrival in find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes)] == [file_path]
+
+def test_failed_scenes_back_off(tmp_path):
+    file_path = str(tmp_path / 'Clip_20221224_0300.tif')
+    touch(file_path)
+    seen, last_sizes, failures = {}, {}, {}
+    find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes)
+    (_, _, signature), = find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes, failures=failures)
+
+    assert record_failure(failures, file_path, signature, 60) == 60
+    assert record_failure(failures, file_path, signature, 60) == 120
+    assert find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes, failures=failures) == []
+    # Due again once the retry time has passed
+    failures[file_path] = failures[file_path][:2] + (0,)
+    assert len(find_arrivals(str(tmp_path), HIMAWARI, seen, last_sizes, failures=failures)) == 1
+
+def test_once_records_only_successes(tmp_path, monkeypatch):
+    folder_path, output_dir = tmp_path / 'in', tmp_path / 'out'
+    folder_path.mkdir()
+    good, bad = str(folder_path / 'Clip_20221224_0300.tif'), str(folder_path / 'Clip_20221224_0400.tif')
+    touch(good)
+    touch(bad)
+    processed = []
+
+    def process_scene(file_path, *args):
+        processed.append(file_path)
+        if file_path == bad:
+            raise RuntimeError("corrupt scene")
+        return file_path
+
+    monkeypatch.setattr(watch_run, 'process_scene', process_scene)
+    state_path = str(tmp_path / 'state.json')
+    watch(str(folder_path), str(output_dir), str(tmp_path / 'cache'), 'diurnal', 2, state_path=state_path, once=True, settle=0)
+    assert processed == [good, bad]
+    assert set(watch_run.read_state(state_path)) == {good}
+
+    # The failed scene is taken again by the next run, the processed one is not
+    watch(str(folder_path), str(output_dir), str(tmp_path / 'cache'), 'diurnal', 2, state_path=state_path, once=True, settle=0)
+    assert processed == [good, bad, bad]
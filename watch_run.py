@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+import argparse
+import main_function
+from batch_run import read_state, write_state
+from tempfil import (
+    get_sensor_profile,
+    default_sensor_profile,
+    parse_acquisition_datetime,
+    file_signatures,
+    format_time,
+)
+
+def scene_output_path(output_dir, file_path):
+    name = os.path.basename(file_path)
+    return os.path.join(output_dir, name[:name.index('.')] + '_filled.tif')
+
+def find_arrivals(folder_path, profile, seen, last_sizes, wait_stable=True, failures=None):
+    """
+    Lists the scenes of a folder that are complete and not processed yet, oldest first.
+
+    A scene counts as complete once its size and modification time are the
+    same at two consecutive polls, so files still being copied are left for
+    the next poll. Scenes that failed are left out until their retry time,
+    unless their file changed meanwhile.
+
+    Args:
+        folder_path (str): Path to the watched folder.
+        profile (SensorProfile): Sensor profile of the files.
+        seen (dict): Signature of every processed file by path, see file_signatures.
+        last_sizes (dict): Signature of every pending file at the previous poll, updated in place.
+        wait_stable (bool, optional): Whether to wait for a second poll before taking a new file. Defaults to True.
+        failures (dict, optional): (signature, attempts, retry time) of every failed file by path, see record_failure.
+            Defaults to None (no failures).
+
+    Returns:
+        list: (acquisition datetime, file_path, signature) of each new scene.
+    """
+    arrivals = []
+    now = time.time()
+    file_paths = [os.path.join(folder_path, name) for name in os.listdir(folder_path) if name.endswith('.tif')]
+    for file_path, signature in zip(file_paths, file_signatures(file_paths)):
+        if seen.get(file_path) == signature:
+            continue
+        failure = (failures or {}).get(file_path)
+        if failure is not None and failure[0] == signature and failure[2] > now:
+            continue
+        stable = last_sizes.get(file_path) == signature
+        last_sizes[file_path] = signature
+        if wait_stable and not stable:
+            continue
+        try:
+            acquisition = parse_acquisition_datetime(os.path.basename(file_path), profile)
+        except ValueError:
+            logging.warning(f"Ignoring {file_path}: not a {profile.name} file name")
+            seen[file_path] = signature
+            continue
+        arrivals.append((acquisition, file_path, signature))
+    arrivals.sort()
+    return arrivals
+
+def record_failure(failures, file_path, signature, interval, max_delay=3600):
+    """
+    Schedules the retry of a scene that failed, doubling its delay at every attempt.
+
+    Args:
+        failures (dict): (signature, attempts, retry time) of every failed file by path, updated in place.
+        file_path (str): Path to the scene.
+        signature (list): Signature of the file that failed, see file_signatures.
+        interval (float): Delay before the first retry, in seconds.
+        max_delay (float, optional): Longest delay between two attempts, in seconds. Defaults to 3600.
+
+    Returns:
+        float: Delay before the next attempt, in seconds.
+    """
+    previous = failures.get(file_path)
+    attempts = previous[1] + 1 if previous is not None and previous[0] == signature else 1
+    delay = min(interval * 2 ** (attempts - 1), max_delay)
+    failures[file_path] = (signature, attempts, time.time() + delay)
+    return delay
+
+def process_scene(file_path, acquisition, folder_path, output_dir, tempfill_type, window_radius, cache_dir, profile,
+                  window_days=None, workers=1, tile_size=256):
+    """
+    Reconstructs the gaps of a newly arrived scene from the updated model state.
+
+    Annual runs update the cached ATC normal equations with the new scene,
+    diurnal runs the hourly DTC statistics, so no stack is refitted.
+
+    Args:
+        file_path (str): Path to the new scene.
+        acquisition (datetime.datetime): Local acquisition date and time of the scene.
+        folder_path (str): Path to the watched folder.
+        output_dir (str): Directory of the gap-filled products.
+        tempfill_type (str): 'annual' or 'diurnal'.
+        window_radius (int): Radius of the moving window.
+        cache_dir (str): Directory of the model state.
+        profile (SensorProfile): Sensor profile of the files.
+        window_days (float, optional): For 'diurnal', days of scenes kept in the hourly statistics. Defaults to None (all).
+        workers (int, optional): Number of worker processes. Defaults to 1.
+        tile_size (int, optional): Height and width of the processing tiles. Defaults to 256.
+
+    Returns:
+        str: Path to the gap-filled product.
+    """
+    output_path = scene_output_path(output_dir, file_path)
+    partial_path = output_path + '.partial.tif'
+    if tempfill_type == 'annual':
+        main_function.main(folder_path, file_path, acquisition.strftime('%Y-%m-%d'), window_radius, partial_path, 'annual',
+                           None, workers=workers, tile_size=tile_size, cache_dir=cache_dir, sensor=profile)
+    else:
+        main_function.main(folder_path, file_path, None, window_radius, partial_path, 'diurnal',
+                           acquisition.strftime('%Y-%m-%d_%H%M'), workers=workers, tile_size=tile_size, cache_dir=cache_dir,
+                           sensor=profile, incremental=True, window_days=window_days)
+    os.replace(partial_path, output_path)
+    return output_path
+
+def watch(folder_path, output_dir, cache_dir, tempfill_type, window_radius, sensor=None, window_days=None, interval=60,
+          state_path=None, skip_existing=False, once=False, workers=1, tile_size=256, settle=5, max_retry_delay=3600):
+    """
+    Watches a folder and writes a gap-filled product for every scene that lands in it.
+
+    Processed scenes are recorded in a state file, so a restarted daemon
+    only handles the scenes that arrived meanwhile. Scenes are only taken
+    once their size and modification time are stable, and only recorded
+    once their product is written: a scene that fails is retried after
+    interval seconds, then after twice as long at every further failure
+    (at once when its file changes), and by the next run after once.
+
+    Args:
+        folder_path (str): Path to the watched folder of LST files.
+        output_dir (str): Directory of the gap-filled products, outside the watched folder.
+        cache_dir (str): Directory of the model state.
+        tempfill_type (str): 'annual' or 'diurnal'.
+        window_radius (int): Radius of the moving window.
+        sensor (str or SensorProfile, optional): Sensor of the files, see get_sensor_profile. Defaults to None
+            ('landsat' for 'annual', 'himawari' for 'diurnal').
+        window_days (float, optional): For 'diurnal', days of scenes kept in the hourly statistics. Defaults to None (all).
+        interval (float, optional): Seconds between two polls of the folder. Defaults to 60.
+        state_path (str, optional): Path of the file recording processed scenes. Defaults to <output_dir>/watch_state.json.
+        skip_existing (bool, optional): On the first start, only record the scenes already in the folder. Defaults to False.
+        once (bool, optional): Process the scenes present now and return, e.g. from cron. Defaults to False.
+        workers (int, optional): Number of worker processes. Defaults to 1.
+        tile_size (int, optional): Height and width of the processing tiles. Defaults to 256.
+        settle (float, optional): With once, seconds between the two looks telling whether a file is still
+            being copied. Defaults to 5.
+        max_retry_delay (float, optional): Longest delay between two attempts at a failing scene, in seconds.
+            Defaults to 3600.
+    """
+    if tempfill_type not in ('annual', 'diurnal'):
+        raise ValueError("Invalid tempfill_type. Supported values are 'annual' or 'diurnal'.")
+    if os.path.abspath(output_dir) == os.path.abspath(folder_path):
+        raise ValueError("output_dir must not be the watched folder, products would be taken for new scenes")
+    profile = get_sensor_profile(sensor) if sensor is not None else default_sensor_profile(tempfill_type)
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = state_path or os.path.join(output_dir, 'watch_state.json')
+    seen = read_state(state_path)
+
+    if skip_existing and not seen:
+        for _, file_path, signature in find_arrivals(folder_path, profile, seen, {}, wait_stable=False):
+            seen[file_path] = signature
+        write_state(state_path, seen)
+
+    last_sizes, failures = {}, {}
+    if once:
+        # A first look, so files still being copied show up as changing at the second one
+        find_arrivals(folder_path, profile, seen, last_sizes)
+        time.sleep(settle)
+    while True:
+        for acquisition, file_path, signature in find_arrivals(folder_path, profile, seen, last_sizes, failures=failures):
+            start_time = time.time()
+            try:
+                output_path = process_scene(file_path, acquisition, folder_path, output_dir, tempfill_type, window_radius,
+                                            cache_dir, profile, window_days, workers, tile_size)
+            except Exception:
+                delay = record_failure(failures, file_path, signature, interval, max_retry_delay)
+                logging.exception(f"Reconstructing {file_path} failed, retrying in {format_time(delay)}")
+                continue
+            logging.info(f"{file_path} -> {output_path} in {format_time(time.time() - start_time)}")
+            failures.pop(file_path, None)
+            seen[file_path] = signature
+            write_state(state_path, seen)
+        if once:
+            return
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruct missing LST pixels of every new scene landing in a folder.")
+    parser.add_argument('folder', help="watched folder of LST files")
+    parser.add_argument('output_dir', help="directory of the gap-filled products")
+    parser.add_argument('--cache-dir', required=True, help="directory of the model state")
+    parser.add_argument('--tempfill-type', choices=('annual', 'diurnal'), required=True)
+    parser.add_argument('--window-radius', type=int, required=True, help="radius of the moving window")
+    parser.add_argument('--sensor', help="sensor of the files (landsat, himawari, modis)")
+    parser.add_argument('--window-days', type=float, help="diurnal: days of scenes kept in the hourly statistics")
+    parser.add_argument('--interval', type=float, default=60, help="seconds between two polls of the folder")
+    parser.add_argument('--state', help="file recording processed scenes (default: <output_dir>/watch_state.json)")
+    parser.add_argument('--skip-existing', action='store_true', help="do not process the scenes already in the folder")
+    parser.add_argument('--once', action='store_true', help="process the scenes present now and exit")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes")
+    parser.add_argument('--tile-size', type=int, default=256, help="height and width of the processing tiles")
+    parser.add_argument('--settle', type=float, default=5, help="with --once, seconds to check that files are no longer copied")
+    parser.add_argument('--max-retry-delay', type=float, default=3600, help="longest delay between two attempts at a failing scene")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    watch(args.folder, args.output_dir, args.cache_dir, args.tempfill_type, args.window_radius, args.sensor, args.window_days,
+          args.interval, args.state, args.skip_existing, args.once, args.workers, args.tile_size, args.settle,
+          args.max_retry_delay)